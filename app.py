@@ -1,63 +1,166 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, session, make_response
 from config import Config
-from models import db, Exercise, DailyWorkout, User
-from exercise_detection import ExerciseDetector
+from models import db, configure_engine, Exercise, DailyWorkout, User, VideoAnalysis
+from migrations import upgrade_schema
+from progress import current_streak, get_progress, rebuild_daily_summaries, serialize_summary, total_progress
+from exercise_detection import ExerciseDetector, InferenceBudget
+from rep_engine import LandmarkRecorder
+from workout_sessions import DetectorPool, SessionRegistry
+from auth import IdentityCache, PasswordHasher
+from rep_checkpoints import RepCheckpointer
+from workout_plans import PlanRoller
+from reminders import ReminderBoard, make_channel
+from pose_workers import PoseWorkerPool
+from frame_pipeline import FramePipeline, StreamPreset
+from frame_ingest import InferenceScheduler, IngestError
+from camera import CameraBroker, open_video_capture
+from cache import FileSystemCache, LRUCache, ResponseCache
+from metrics import collect_metrics
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import date, timedelta, datetime
-import cv2
-import numpy as np
+import base64
+import hashlib
+import hmac
+import json
+import os
+import uuid
+from werkzeug.utils import secure_filename
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from apscheduler.schedulers.background import BackgroundScheduler
 import atexit
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload
 import pytz  # Make sure to install pytz if you haven't already
 
 
 app = Flask(__name__)
 app.config.from_object(Config)
 db.init_app(app)
+with app.app_context():
+    configure_engine(db.engine, Config.SQLITE_PRAGMAS)
 
 # Initialize LoginManager after creating Flask app
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Logged-in users are served from memory; password hashing runs on its own small pool
+identities = IdentityCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL)
+passwords = PasswordHasher(Config.PASSWORD_WORKERS, Config.PASSWORD_HASH_METHOD)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-detector = ExerciseDetector()
-
-class WorkoutSession:
-    def __init__(self, exercise_id, exercise_name, target_reps):
-        self.exercise_id = exercise_id
-        self.exercise_name = exercise_name
-        self.target_reps = target_reps
-        self.current_reps = 0
-        self.stage = 'init'
-        self.angle = 0
-
-current_workout = None
+    return identities.get(int(user_id))
+
+# Optionally run pose inference in worker processes instead of the web process
+pose_workers = None
+detector_factory = ExerciseDetector
+if Config.POSE_WORKERS:
+    pose_workers = PoseWorkerPool(Config.POSE_WORKERS, slots=Config.POSE_WORKER_SLOTS,
+                                  max_frame_size=(Config.CAMERA_WIDTH, Config.CAMERA_HEIGHT),
+                                  pose_options=ExerciseDetector.POSE_OPTIONS,
+                                  timeout=Config.POSE_WORKER_TIMEOUT)
+    detector_factory = lambda: ExerciseDetector(pose=pose_workers.lease())
+    atexit.register(pose_workers.close)
+
+# Active workouts keyed by user, each with its own pooled detector
+sessions = SessionRegistry(
+    DetectorPool(detector_factory, max_idle=Config.DETECTOR_POOL_SIZE),
+    idle_timeout=Config.SESSION_IDLE_TIMEOUT
+)
+
+# Per-user cache of dashboard and calendar data, invalidated when workouts change
+file_cache = None
+if Config.RESPONSE_CACHE_TYPE == 'filesystem':
+    file_cache = FileSystemCache(Config.RESPONSE_CACHE_DIR, Config.RESPONSE_CACHE_TTL)
+    response_cache = ResponseCache(file_cache)
+else:
+    response_cache = ResponseCache(LRUCache(Config.RESPONSE_CACHE_SIZE, Config.RESPONSE_CACHE_TTL))
+
+# Today's incomplete workouts for every user, recomputed in the background
+reminder_board = ReminderBoard(make_channel(Config.REMINDER_CHANNEL, Config.REMINDER_OUTBOX))
+
+def refresh_reminders():
+    with app.app_context():
+        try:
+            reminder_board.refresh()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"Reminder refresh failed: {e}")
+
+def reps_saved(user_ids):
+    response_cache.invalidate_users(user_ids)
+    reminder_board.refresh(user_ids)
+
+# Live rep counts reach the database every few seconds and when a session ends
+checkpointer = RepCheckpointer(app, sessions, interval=Config.REP_CHECKPOINT_INTERVAL, on_flush=reps_saved)
+sessions.on_close = checkpointer.finish
+
+# Nightly roll-forward of every user's workout plan
+plan_roller = PlanRoller(days=Config.PLAN_DAYS_AHEAD, batch_size=Config.PLAN_BATCH_SIZE,
+                         default_target_reps=Config.PLAN_DEFAULT_TARGET_REPS,
+                         on_batch=response_cache.invalidate_users)
+
+def roll_plans_forward():
+    with app.app_context():
+        try:
+            plan_roller.run()
+        except SQLAlchemyError as e:
+            # Committed batches stay planned; the next run fills in the rest
+            db.session.rollback()
+            print(f"Plan roll-forward failed: {e}")
+
+scheduler = BackgroundScheduler(timezone=pytz.timezone(Config.PLAN_TIMEZONE))
+if Config.PLAN_JOB_ENABLED:
+    scheduler.add_job(roll_plans_forward, 'cron', id='roll_plans_forward', coalesce=True,
+                      misfire_grace_time=3600, **Config.PLAN_SCHEDULE)
+# Abandoned workouts give back their detector even if nobody else starts one
+scheduler.add_job(sessions.evict_idle, 'interval', id='evict_idle_sessions', coalesce=True,
+                  seconds=Config.SESSION_EVICT_INTERVAL)
+scheduler.add_job(refresh_reminders, 'interval', id='refresh_reminders', coalesce=True,
+                  minutes=Config.REMINDER_INTERVAL_MINUTES, next_run_time=datetime.now(scheduler.timezone))
+if file_cache is not None:
+    # Expired cache files are removed here rather than by whichever request happens to write next
+    scheduler.add_job(file_cache.sweep, 'interval', id='sweep_response_cache', coalesce=True,
+                      seconds=file_cache.sweep_interval)
+
+def start_background_jobs():
+    """
+    Start the rep checkpointer and the scheduled jobs. Only serving entry points call this
+    (`python app.py`, create_app, asgi_stream.create_asgi_app), so scripts that merely import
+    the app, like migrations or video_analysis, run no jobs and send no reminders.
+    """
+    if scheduler.running:
+        return
+    checkpointer.start()
+    atexit.register(checkpointer.stop)
+    scheduler.start()
+    atexit.register(scheduler.shutdown)
+
+
+def create_app():
+    """WSGI entry point for production servers, e.g. gunicorn 'app:create_app()'"""
+    start_background_jobs()
+    return app
+
+# One capture per video source, shared by every session that streams from it
+camera_broker = CameraBroker(
+    lambda source: open_video_capture(source, Config.CAMERA_WIDTH, Config.CAMERA_HEIGHT)
+)
+
+# Shared inference for sessions whose browser captures and uploads the frames
+ingest = InferenceScheduler(workers=Config.INGEST_WORKERS, batch_size=Config.INGEST_BATCH_SIZE,
+                            batch_window=Config.INGEST_BATCH_WINDOW, max_fps=Config.INGEST_MAX_FPS,
+                            burst=Config.INGEST_BURST)
 
 @app.route('/')
 @login_required
 def index():
     today = date.today()
-    daily_workouts = DailyWorkout.query.filter_by(user_id=current_user.id, date=today).all()
-
-    # Prepare data for display
-    workout_data = []
-    for workout in daily_workouts:
-        remaining_reps = max(0, workout.target_reps - workout.completed_reps)
-        workout_data.append({
-            "exercise_id": workout.exercise.id,
-            "exercise_name": workout.exercise.name,
-            "target_reps": workout.target_reps,
-            "completed_reps": workout.completed_reps,
-            "remaining_reps": remaining_reps,
-            "is_completed": workout.is_completed
-        })
-
-    # Get incomplete workouts filtered by current_user.id
-    incomplete_workouts = check_incomplete_workouts(current_user.id)  # Pass current_user.id to the function
+    # Dashboard data is cached per user and day until their workouts change
+    dashboard, etag = response_cache.get_or_set(
+        current_user.id, f'index:{today}', lambda: load_dashboard(current_user.id, today)
+    )
 
     # Check if we should show the reminder
     last_reminder_time = session.get('last_reminder_time')
@@ -79,7 +182,54 @@ def index():
         show_reminder = True
         session['last_reminder_time'] = current_time.isoformat()  # Store as ISO format string
 
-    return render_template('index.html', daily_workouts=workout_data, today=today, incomplete_workouts=incomplete_workouts, show_reminder=show_reminder)  # Pass show_reminder to the template
+    # Computed in the background by refresh_reminders; this is a dict lookup
+    incomplete_workouts = reminder_board.get(current_user.id)
+
+    # hash() is salted per process, so the reminders get a digest every worker agrees on
+    reminders_digest = hashlib.sha1(json.dumps(incomplete_workouts, default=str).encode()).hexdigest()[:8]
+    return conditional_response(
+        f'{etag}-{int(show_reminder)}-{reminders_digest}-{Config.STREAM_MODE}',
+        lambda: render_template('index.html', daily_workouts=dashboard['daily_workouts'], today=today,
+                                incomplete_workouts=incomplete_workouts,
+                                show_reminder=show_reminder,  # Pass show_reminder to the template
+                                stream_mode=Config.STREAM_MODE,
+                                local_preview=Config.STREAM_LOCAL_PREVIEW)
+    )
+
+
+def load_dashboard(user_id, today):
+    # Load each workout's exercise in the same query instead of one SELECT per row
+    daily_workouts = DailyWorkout.query.options(joinedload(DailyWorkout.exercise)).filter_by(
+        user_id=user_id, date=today
+    ).all()
+
+    # Prepare data for display
+    workout_data = []
+    for workout in daily_workouts:
+        remaining_reps = max(0, workout.target_reps - workout.completed_reps)
+        workout_data.append({
+            "exercise_id": workout.exercise.id,
+            "exercise_name": workout.exercise.name,
+            "target_reps": workout.target_reps,
+            "completed_reps": workout.completed_reps,
+            "remaining_reps": remaining_reps,
+            "is_completed": workout.is_completed
+        })
+
+    return {"daily_workouts": workout_data}
+
+
+def conditional_response(etag, build):
+    """Answer 304 if the client already has this version, otherwise build the full response"""
+    etag = f'{current_user.id}-{etag}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(build())
+    response.set_etag(etag)
+    # Browsers must revalidate, which the ETag makes cheap
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 
@@ -87,7 +237,6 @@ def index():
 @app.route('/start_workout', methods=['POST'])
 @login_required
 def start_workout():
-    global current_workout
     exercise_id = request.form.get('exercise_id')
 
     # Validate the selected exercise for the logged-in user
@@ -103,9 +252,32 @@ def start_workout():
     if not exercise:
         return jsonify({"status": "error", "message": "Invalid exercise ID"}), 400
 
+    # Pick how much inference this session may spend per frame
+    inference_mode = request.form.get('inference_mode', Config.DEFAULT_INFERENCE_MODE)
+    if inference_mode not in Config.INFERENCE_MODES:
+        return jsonify({"status": "error", "message": "Invalid inference mode"}), 400
+    preset = Config.INFERENCE_MODES[inference_mode]
+    budget = InferenceBudget(**preset) if preset else None
+
+    # And how its video stream is encoded
+    stream_preset_name = request.form.get('stream_preset', Config.DEFAULT_STREAM_PRESET)
+    if stream_preset_name not in Config.STREAM_PRESETS:
+        return jsonify({"status": "error", "message": "Invalid stream preset"}), 400
+    preset = Config.STREAM_PRESETS[stream_preset_name]
+    stream_preset = StreamPreset(**preset) if preset else None
+
+    recorder = None
+    if Config.RECORD_LANDMARKS:
+        log_name = f"{current_user.id}_{exercise.name}_{datetime.now():%Y%m%d-%H%M%S}.npy"
+        recorder = LandmarkRecorder(os.path.join(Config.LANDMARK_LOG_DIR, log_name))
+
     # Start the workout session
-    current_workout = WorkoutSession(exercise.id, exercise.name, daily_workout.target_reps)
-    print(f"Starting workout: {current_workout.exercise_name}, Target Reps: {current_workout.target_reps}")
+    workout = sessions.start(current_user.id, exercise.id, exercise.name,
+                             daily_workout.target_reps, budget, stream_preset, recorder)
+    print(f"Starting workout: {workout.exercise_name}, Target Reps: {workout.target_reps}")
+    checkpointer.resume(workout)
+    if workout.exercise_rule is None:
+        print(f"No rep rule defined for {exercise.name}; add it to Config.EXERCISE_DEFINITIONS")
 
     return jsonify({
         "status": "success",
@@ -117,92 +289,184 @@ def start_workout():
     })
 
 
-def generate_frames():
-    global current_workout
-    cap = cv2.VideoCapture(0)
+def open_camera():
+    # Every viewer shares the broker's single capture of the configured source
+    return camera_broker.subscribe(Config.VIDEO_SOURCE)
 
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 960)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
 
-    try:
-        while current_workout:
-            success, frame = cap.read()
-            if not success or current_workout is None:
-                print("Error: Failed to capture frame or workout ended.")
-                break
-
-            # Process frame
-            processed_frame, angle, stage, counter = detector.process_frame(
-                frame,
-                current_workout.exercise_name.lower(),
-                current_workout.stage,
-                current_workout.current_reps
-            )
-
-            # Update workout session
-            if current_workout:  # Ensure current_workout is not None
-                current_workout.angle = angle
-                current_workout.stage = stage
-                current_workout.current_reps = counter
-
-            # Render UI
-            processed_frame = detector.render_ui(
-                processed_frame,
-                current_workout.current_reps if current_workout else 0,
-                current_workout.stage if current_workout else 'init',
-                current_workout.angle if current_workout else 0,
-                frame.shape[1],
-                current_workout.exercise_name if current_workout else ''
-            )
-
-            # Encode frame for streaming
-            ret, buffer = cv2.imencode('.jpg', processed_frame)
-            frame = buffer.tobytes()
-            
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+def make_pipeline(session):
+    return FramePipeline(session, open_camera, Config.STREAM_CLIENT_QUEUE_SIZE, session.stream_preset,
+                         debug_overlay=Config.STREAM_DEBUG_OVERLAY)
+
 
+def open_stream(user_id, client, kind='video'):
+    """
+    Attach an external client queue to the user's workout stream
+
+    Args:
+        kind (str): 'video' for JPEG chunks or 'landmarks' for packed landmark frames
+
+    Returns:
+        callable: Detaches the client, or None if the user has no active workout
+    """
+    workout = sessions.get(user_id)
+    if workout is None:
+        return None
+    pipeline, client = workout.subscribe(make_pipeline, client, kind)
+    return lambda: pipeline.unsubscribe(client)
+
+
+def generate_frames(user_id, kind='video'):
+    workout = sessions.get(user_id)
+    if workout is None:
+        return
+
+    # Capture, inference and encoding run in the session's pipeline threads;
+    # this generator only drains the latest encoded frames for one client
+    pipeline, frames = workout.subscribe(make_pipeline, kind=kind)
+    try:
+        while True:
+            chunk = frames.get(timeout=1.0)
+            if chunk is None:
+                if frames.closed:
+                    break
+                continue
+            yield chunk
     finally:
-        cap.release()
-        print("Workout ended or video capture released.")
+        pipeline.unsubscribe(frames)
+
+
+def generate_landmark_events(user_id):
+    # SSE is text-only, so each packed frame travels base64-encoded
+    for payload in generate_frames(user_id, kind='landmarks'):
+        yield b'data: ' + base64.b64encode(payload) + b'\n\n'
 
 
 @app.route('/video_feed')
 @login_required
 def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    # The generator runs outside the request context, so resolve the user now
+    return Response(generate_frames(current_user.id), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/stream_stats')
+@login_required
+def stream_stats():
+    """Encoder throughput of the user's running video stream"""
+    workout = sessions.get(current_user.id)
+    if workout is None or workout.pipeline is None:
+        return jsonify({"status": "error", "message": "No active stream"}), 404
+    return jsonify({"status": "success", "stats": workout.pipeline.stats.as_dict()})
+
+@app.route('/metrics')
+def metrics():
+    """Pipeline latency, frame rate and drop metrics in the Prometheus text format"""
+    if not Config.METRICS_ENABLED:
+        return jsonify({"status": "error", "message": "Metrics are disabled"}), 404
+    if Config.METRICS_TOKEN and not hmac.compare_digest(request.headers.get('Authorization', ''),
+                                                        f'Bearer {Config.METRICS_TOKEN}'):
+        return jsonify({"status": "error", "message": "Unauthorized"}), 401
+    return Response(collect_metrics(sessions, ingest, plan_roller), mimetype='text/plain; version=0.0.4')
+
+@app.route('/landmark_feed')
+@login_required
+def landmark_feed():
+    # Landmarks and metrics only; the browser draws the overlay itself
+    return Response(generate_landmark_events(current_user.id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
+@app.route('/ingest_frame', methods=['POST'])
+@login_required
+def ingest_frame():
+    """
+    Run pose inference on one frame captured by the browser. The body is a
+    JPEG (or PNG) image and the `seq` query argument its frame number; the
+    response is the packed landmark frame for the browser to draw.
+    """
+    workout = sessions.get(current_user.id)
+    if workout is None:
+        return jsonify({"status": "error", "message": "No active workout"}), 404
+
+    sequence = request.args.get('seq', type=int)
+    if sequence is None:
+        return jsonify({"status": "error", "message": "Missing frame sequence number"}), 400
+    if request.content_length and request.content_length > Config.INGEST_MAX_FRAME_BYTES:
+        return jsonify({"status": "error", "message": "Frame too large"}), 413
+    data = request.get_data()
+    if not data:
+        return jsonify({"status": "error", "message": "Empty frame"}), 400
+
+    try:
+        payload = ingest.submit(workout, sequence, data).result(timeout=Config.INGEST_TIMEOUT)
+    except IngestError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except FutureTimeoutError:
+        return jsonify({"status": "error", "message": "Inference timed out"}), 503
+
+    return Response(payload, mimetype='application/octet-stream', headers={'Cache-Control': 'no-store'})
 
 @app.route('/end_workout', methods=['POST'])
 @login_required
 def end_workout():
-    global current_workout
-    
-    if not current_workout:
+    # Ending the session writes its remaining reps through the checkpointer
+    workout = sessions.end(current_user.id)
+    if not workout:
         return jsonify({"status": "error", "message": "No active workout"}), 400
 
-    daily_workout = DailyWorkout.query.filter_by(
-        user_id=current_user.id,
-        exercise_id=current_workout.exercise_id,
-        date=date.today()
-    ).first()
+    reps = workout.snapshot()[0]
+    if not workout.final_flushed:
+        # The checkpointer keeps retrying them in the background
+        return jsonify({"status": "error",
+                        "message": "Could not save the latest reps yet; they will be saved shortly"}), 503
 
-    if not daily_workout:
-        return jsonify({"status": "error", "message": "No matching daily workout"}), 404
+    return jsonify({"status": "success", "reps": reps})
 
-    # Add the current reps to the previously completed reps
-    daily_workout.completed_reps += current_workout.current_reps
 
-    # Update the is_completed status
-    daily_workout.is_completed = daily_workout.completed_reps >= daily_workout.target_reps
 
+
+@app.route('/analyze_video', methods=['POST'])
+@login_required
+def analyze_video():
+    # Uploads are queued here and analyzed offline by `python video_analysis.py --pending`
+    video = request.files.get('video')
+    if not video or not video.filename:
+        return jsonify({"status": "error", "message": "No video uploaded"}), 400
+
+    exercise = Exercise.query.get(request.form.get('exercise_id'))
+    if not exercise:
+        return jsonify({"status": "error", "message": "Invalid exercise ID"}), 400
+
+    os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+    path = os.path.join(Config.UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{secure_filename(video.filename)}")
+    video.save(path)
+
+    analysis = VideoAnalysis(user_id=current_user.id, exercise_id=exercise.id, video_path=path)
+    db.session.add(analysis)
     db.session.commit()
 
-    reps = current_workout.current_reps
-    current_workout = None
+    return jsonify({"status": "success", "analysis_id": analysis.id})
 
-    return jsonify({"status": "success", "reps": reps})
 
+@app.route('/analyze_video/<int:analysis_id>', methods=['GET'])
+@login_required
+def get_video_analysis(analysis_id):
+    analysis = VideoAnalysis.query.filter_by(id=analysis_id, user_id=current_user.id).first()
+    if not analysis:
+        return jsonify({"status": "error", "message": "Analysis not found"}), 404
 
+    return jsonify({
+        "status": "success",
+        "analysis": {
+            "id": analysis.id,
+            "exercise_name": analysis.exercise.name,
+            "state": analysis.status,
+            "total_reps": analysis.total_reps,
+            "duration": analysis.duration,
+            "reps": [
+                {"rep_number": rep.rep_number, "timestamp": rep.timestamp, "angle": rep.angle}
+                for rep in analysis.reps
+            ]
+        }
+    })
 
 from calendar import monthrange
 
@@ -217,11 +481,25 @@ def get_calendar():
     first_day_of_month = today.replace(day=1)
     days_in_month = monthrange(today.year, today.month)[1]
 
-    # Replace user_id with current_user.id
-    daily_workouts = DailyWorkout.query.filter(
-        DailyWorkout.user_id == current_user.id,
+    calendar, etag = response_cache.get_or_set(
+        current_user.id, f'calendar:{first_day_of_month:%Y-%m}',
+        lambda: load_calendar(current_user.id, first_day_of_month, days_in_month)
+    )
+    return conditional_response(etag, lambda: jsonify(calendar))
+
+
+def load_calendar(user_id, first_day_of_month, days_in_month):
+    # Fetch only the needed columns, joined with the exercise name, in one query
+    daily_workouts = db.session.query(
+        DailyWorkout.date,
+        Exercise.name.label('exercise_name'),
+        DailyWorkout.target_reps,
+        DailyWorkout.completed_reps,
+        DailyWorkout.is_completed
+    ).join(Exercise, DailyWorkout.exercise_id == Exercise.id).filter(
+        DailyWorkout.user_id == user_id,
         DailyWorkout.date >= first_day_of_month,
-        DailyWorkout.date <= today.replace(day=days_in_month)
+        DailyWorkout.date <= first_day_of_month.replace(day=days_in_month)
     ).all()
 
     # Organize data by date
@@ -232,21 +510,80 @@ def get_calendar():
         if date_str not in calendar_data:
             calendar_data[date_str] = []
         calendar_data[date_str].append({
-            "exercise_name": workout.exercise.name,
+            "exercise_name": workout.exercise_name,
             "target_reps": workout.target_reps,
             "completed_reps": workout.completed_reps,
             "is_completed": workout.is_completed
         })
 
-    # Return calendar data as JSON
-    return jsonify({
+    # Calendar data as JSON
+    return {
         "status": "success",
         "calendar_data": calendar_data,
         "days_in_month": days_in_month,
         "start_weekday": first_day_of_month.weekday()
+    }
+
+
+def parse_date_arg(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+@app.route('/progress', methods=['GET'])
+@login_required
+def get_progress_range():
+    # Served from the per-day rollups, so the cost depends only on the number of days requested
+    today = date.today()
+    try:
+        start = parse_date_arg('start', today.replace(day=1))
+        end = parse_date_arg('end', today)
+    except ValueError:
+        return jsonify({"status": "error", "message": "Dates must be YYYY-MM-DD"}), 400
+    if end < start or (end - start).days >= Config.PROGRESS_MAX_DAYS:
+        return jsonify({"status": "error", "message": "Invalid date range"}), 400
+
+    summaries = get_progress(current_user.id, start, end)
+    return jsonify({
+        "status": "success",
+        "progress": {summary.date.strftime('%Y-%m-%d'): serialize_summary(summary) for summary in summaries},
+        "totals": total_progress(summaries)
     })
 
 
+@app.route('/progress/year', methods=['GET'])
+@login_required
+def get_yearly_progress():
+    try:
+        year = int(request.args.get('year', date.today().year))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Year must be a number"}), 400
+    if not date.min.year <= year <= date.max.year:
+        return jsonify({"status": "error", "message": "Invalid year"}), 400
+    summaries = get_progress(current_user.id, date(year, 1, 1), date(year, 12, 31))
+
+    months = {}
+    for summary in summaries:
+        months.setdefault(summary.date.month, []).append(summary)
+
+    return jsonify({
+        "status": "success",
+        "year": year,
+        "months": {month: total_progress(month_summaries) for month, month_summaries in months.items()},
+        "totals": total_progress(summaries)
+    })
+
+
+@app.route('/progress/streak', methods=['GET'])
+@login_required
+def get_streak():
+    return jsonify({
+        "status": "success",
+        "current_streak": current_streak(current_user.id, date.today())
+    })
+
 
 
 def create_dummy_data():
@@ -262,7 +599,7 @@ def create_dummy_data():
         ]
         for user_data in users:
             user = User(name=user_data['name'], email=user_data['email'])
-            user.set_password(user_data['password'])
+            user.set_password(user_data['password'], Config.PASSWORD_HASH_METHOD)
             db.session.add(user)
         db.session.commit()
 
@@ -294,6 +631,8 @@ def create_dummy_data():
                         target_reps=10 + day_offset * 2,  # Example varying target reps
                     ))
         db.session.commit()
+        rebuild_daily_summaries()
+        response_cache.clear()
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -305,11 +644,26 @@ def login():
         email = request.form.get('email')
         password = request.form.get('password')
         user = User.query.filter_by(email=email).first()
-        
-        if user and user.check_password(password):
-            login_user(user)
-            next_page = request.args.get('next')
-            return redirect(next_page or url_for('index'))
+
+        if user:
+            try:
+                valid = passwords.verify(user.password_hash, password).result(timeout=Config.PASSWORD_TIMEOUT)
+            except FutureTimeoutError:
+                return render_template('login.html', error="Too many sign-ins right now, please try again"), 503
+
+            if valid:
+                if passwords.needs_rehash(user.password_hash):
+                    # Move hashes made with older parameters to the configured ones. If the pool is too
+                    # busy, the sign-in goes ahead and the upgrade waits for a later one.
+                    rehash = passwords.hash(password)
+                    try:
+                        user.password_hash = rehash.result(timeout=Config.PASSWORD_TIMEOUT)
+                        db.session.commit()
+                    except FutureTimeoutError:
+                        rehash.cancel()
+                login_user(user)
+                next_page = request.args.get('next')
+                return redirect(next_page or url_for('index'))
             
         return render_template('login.html', error="Invalid email or password")
         
@@ -318,29 +672,17 @@ def login():
 @app.route('/logout', methods=['GET', 'POST'])
 @login_required
 def logout():
+    identities.invalidate(current_user.id)
     logout_user()
     return redirect(url_for('login'))
 
 
-# Function to check incomplete workouts for a specific user
-def check_incomplete_workouts(user_id):
-    today = date.today()
-    daily_workouts = DailyWorkout.query.filter_by(user_id=user_id, date=today).all()
-    incomplete_workouts = [
-        {
-            "exercise_name": workout.exercise.name,
-            "remaining_reps": workout.target_reps - workout.completed_reps
-        }
-        for workout in daily_workouts if not workout.is_completed
-    ]
-    
-    if incomplete_workouts:
-        print(f"Reminder for user ID {user_id}: You have incomplete workouts for today:")
-        for workout in incomplete_workouts:
-            print(f"{workout['exercise_name']}: {workout['remaining_reps']} reps remaining")
-
-
 if __name__ == '__main__':
     with app.app_context():
+        upgrade_schema()
         create_dummy_data()
+    # The debug reloader runs this module in a watcher process and again in the serving child;
+    # only the child runs the background jobs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_jobs()
     app.run(debug=True)
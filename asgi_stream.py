@@ -0,0 +1,249 @@
+"""
+Event-driven serving mode for /video_feed.
+
+Frames are still produced by the session pipelines' threads, but delivery
+to viewers happens on a single asyncio event loop, so an open stream costs
+a small queue instead of a whole worker thread. Run it with any ASGI
+server, e.g.
+
+    uvicorn --factory asgi_stream:create_asgi_app
+
+The same loop also serves /landmark_ws, a WebSocket carrying the packed
+landmark frames of landmark_codec as binary messages for browsers that
+draw the overlay themselves.
+
+Every other path is handed to the Flask app when asgiref is installed.
+"""
+import asyncio
+from http.cookies import SimpleCookie
+
+_CLOSED = object()
+
+
+class AsyncFrameQueue:
+    """
+    Drop-oldest queue fed from pipeline threads and drained on the event loop.
+    Has the same put()/close() interface as FrameQueue so pipelines can
+    publish to it directly.
+    """
+
+    def __init__(self, loop, maxsize=2):
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        # Called from pipeline threads
+        self._call_soon(self._put, item)
+
+    def close(self):
+        self._call_soon(self._close)
+
+    def _call_soon(self, callback, *args):
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # The event loop has already shut down
+            pass
+
+    def _put(self, item):
+        if self.closed:
+            return
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    def _close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(_CLOSED)
+
+    async def get(self):
+        """Next item, or None once the queue is closed"""
+        item = await self._queue.get()
+        return None if item is _CLOSED else item
+
+
+class StreamServer:
+    """
+    ASGI application serving multipart MJPEG streams asynchronously.
+
+    Args:
+        open_stream (callable): (user_id, client) -> detach callable, or None if there is nothing to stream
+        authenticate (callable): ASGI scope -> user id, or None if the request isn't logged in
+        fallback: ASGI app for every other path
+        path (str): Path the stream is served on
+        queue_size (int): Frames buffered per viewer before the oldest is dropped
+        open_landmark_stream (callable): Same contract as open_stream for packed landmark frames;
+            the WebSocket endpoint is only served when it is given
+        landmark_path (str): Path the landmark WebSocket is served on
+    """
+
+    def __init__(self, open_stream, authenticate, fallback=None, path='/video_feed', queue_size=2,
+                 open_landmark_stream=None, landmark_path='/landmark_ws'):
+        self.open_stream = open_stream
+        self.authenticate = authenticate
+        self.fallback = fallback
+        self.path = path
+        self.queue_size = queue_size
+        self.open_landmark_stream = open_landmark_stream
+        self.landmark_path = landmark_path
+        self.open_streams = 0
+
+    async def __call__(self, scope, receive, send):
+        # The WSGI fallback only understands http, so lifespan and websockets never reach it
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'websocket':
+            if scope['path'] == self.landmark_path and self.open_landmark_stream is not None:
+                await self.landmark_socket(scope, receive, send)
+            else:
+                # Closing before accepting rejects the handshake
+                await send({'type': 'websocket.close', 'code': 1008})
+        elif scope['path'] == self.path:
+            await self.stream(scope, receive, send)
+        elif self.fallback is not None:
+            await self.fallback(scope, receive, send)
+        else:
+            await self._respond(send, 404, b'Not Found')
+
+    async def stream(self, scope, receive, send):
+        user_id = self.authenticate(scope)
+        if user_id is None:
+            await self._respond(send, 401, b'Unauthorized')
+            return
+
+        loop = asyncio.get_running_loop()
+        client = AsyncFrameQueue(loop, self.queue_size)
+        # Attaching may start a pipeline and open the camera, so keep it off the loop
+        detach = await loop.run_in_executor(None, self.open_stream, user_id, client)
+        if detach is None:
+            await self._respond(send, 404, b'No active workout')
+            return
+
+        self.open_streams += 1
+        watcher = asyncio.ensure_future(self._watch_disconnect(receive, client))
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [(b'content-type', b'multipart/x-mixed-replace; boundary=frame'),
+                            (b'cache-control', b'no-store')],
+            })
+            while True:
+                chunk = await client.get()
+                if chunk is None:
+                    break
+                # The server applies transport backpressure here; frames that
+                # arrive meanwhile replace older ones in the client queue
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        except OSError:
+            # Client went away mid-send
+            pass
+        finally:
+            self.open_streams -= 1
+            watcher.cancel()
+            await loop.run_in_executor(None, detach)
+
+    async def landmark_socket(self, scope, receive, send):
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+        user_id = self.authenticate(scope)
+        if user_id is None:
+            # Closing before accepting makes the server answer the handshake with 403
+            await send({'type': 'websocket.close', 'code': 1008})
+            return
+
+        loop = asyncio.get_running_loop()
+        client = AsyncFrameQueue(loop, self.queue_size)
+        detach = await loop.run_in_executor(None, self.open_landmark_stream, user_id, client)
+        if detach is None:
+            await send({'type': 'websocket.close', 'code': 1008})
+            return
+
+        self.open_streams += 1
+        watcher = asyncio.ensure_future(self._watch_disconnect(receive, client, 'websocket.disconnect'))
+        try:
+            await send({'type': 'websocket.accept'})
+            while True:
+                payload = await client.get()
+                if payload is None:
+                    break
+                await send({'type': 'websocket.send', 'bytes': payload})
+            if not watcher.done():
+                await send({'type': 'websocket.close', 'code': 1000})
+        except OSError:
+            pass
+        finally:
+            self.open_streams -= 1
+            watcher.cancel()
+            await loop.run_in_executor(None, detach)
+
+    async def _watch_disconnect(self, receive, client, disconnect_type='http.disconnect'):
+        while True:
+            message = await receive()
+            if message['type'] == disconnect_type:
+                client.close()
+                return
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _respond(self, send, status, body):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def flask_session_user(flask_app):
+    """Build an authenticate() callable that reads the Flask-Login user id from the session cookie"""
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+    max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+    def authenticate(scope):
+        header = b'; '.join(value for name, value in scope.get('headers', []) if name == b'cookie')
+        morsel = SimpleCookie(header.decode('latin-1')).get(cookie_name)
+        if morsel is None:
+            return None
+        try:
+            data = serializer.loads(morsel.value, max_age=max_age)
+        except Exception:
+            return None
+        user_id = data.get('_user_id')
+        return int(user_id) if user_id is not None else None
+
+    return authenticate
+
+
+def create_asgi_app():
+    from functools import partial
+
+    from app import app, open_stream, start_background_jobs
+    from config import Config
+
+    start_background_jobs()
+
+    try:
+        from asgiref.wsgi import WsgiToAsgi
+        fallback = WsgiToAsgi(app)
+    except ImportError:
+        print("asgiref is not installed; only /video_feed is served")
+        fallback = None
+
+    return StreamServer(open_stream, flask_session_user(app), fallback,
+                        queue_size=Config.STREAM_CLIENT_QUEUE_SIZE,
+                        open_landmark_stream=partial(open_stream, kind='landmarks'))
@@ -0,0 +1,102 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_login import UserMixin
+from sqlalchemy import event
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from cache import LRUCache
+from models import db, User
+
+
+class UserIdentity(UserMixin):
+    """
+    What a request needs to know about the logged-in user, detached from
+    any database session so it can be shared between threads.
+    """
+
+    def __init__(self, id, name, email):
+        self.id = id
+        self.name = name
+        self.email = email
+
+
+class IdentityCache:
+    """
+    Bounded, TTL'd cache of UserIdentity by user id for Flask-Login's
+    user_loader, so authenticated requests don't query the users table.
+
+    Entries are dropped on logout and whenever a User row is updated or
+    deleted through the ORM (e.g. set_password), so a changed identity is
+    picked up on the next request. Changes made with bulk SQL, or by
+    another process, show up once the entry's TTL expires.
+
+    Args:
+        max_entries (int): Users kept before the least recently used are evicted
+        ttl (float): Seconds an identity is trusted before it is reloaded
+    """
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self._cache = LRUCache(max_entries, ttl)
+        self.hits = 0
+        self.misses = 0
+        event.listen(User, 'after_update', self._user_changed)
+        event.listen(User, 'after_delete', self._user_changed)
+
+    def get(self, user_id):
+        """The user's identity, or None if there is no such user"""
+        identity = self._cache.get(user_id)
+        if identity is not None:
+            self.hits += 1
+            return identity
+
+        self.misses += 1
+        row = db.session.query(User.id, User.name, User.email).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        identity = UserIdentity(*row)
+        self._cache.set(user_id, identity)
+        return identity
+
+    def invalidate(self, user_id):
+        self._cache.delete(user_id)
+
+    def _user_changed(self, mapper, connection, user):
+        self.invalidate(user.id)
+
+
+class PasswordHasher:
+    """
+    Password hashing and verification on a small dedicated thread pool.
+    The hash functions release the GIL, so a login burst is limited to
+    `workers` cores instead of competing with the streaming threads for
+    every one of them.
+
+    Args:
+        workers (int): Hashes computed at once
+        method (str): werkzeug hash spec with all its parameters, e.g. 'scrypt:32768:8:1' or
+            'pbkdf2:sha256:600000'. Stored hashes made with other parameters are upgraded on login.
+    """
+
+    def __init__(self, workers=2, method='scrypt:32768:8:1'):
+        self.method = method
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+
+    def hash(self, password):
+        """
+        Returns:
+            Future: Resolves to the password hash
+        """
+        return self._executor.submit(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """
+        Returns:
+            Future: Resolves to whether the password matches
+        """
+        return self._executor.submit(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,302 @@
+"""
+Headless, reproducible benchmarks for the detection path and the web
+endpoints. Results are written as JSON so runs can be compared across
+commits:
+
+    python benchmark_suite.py --output before.json
+    ... change something ...
+    python benchmark_suite.py --output after.json --baseline before.json
+
+With --baseline, any latency that grew or throughput that shrank by more
+than --tolerance is reported and the exit status is 1.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from exercise_detection import ExerciseDetector
+from exercise_detection_benchmark import CannedPose, load_frames
+from pose_angles import JOINTS
+
+# Joint each exercise is tracked by, and the range a synthetic rep sweeps through
+SYNTHETIC_REPS = {
+    'bicep_curls': ('left_elbow', 20, 175),
+    'squats': ('left_knee', 70, 175),
+    'push_ups': ('left_elbow', 40, 175),
+}
+
+
+def latency_summary(samples):
+    """
+    Returns:
+        dict: Mean and p50/p95/p99 of `samples` (seconds) in milliseconds
+    """
+    values = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(values, (50, 95, 99))
+    return {'mean_ms': float(values.mean()), 'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+
+def timed(step, inputs):
+    samples = []
+    for item in inputs:
+        started = time.perf_counter()
+        step(item)
+        samples.append(time.perf_counter() - started)
+    return latency_summary(samples)
+
+
+def synthetic_landmarks(exercise, reps, frames_per_rep=30):
+    """
+    Landmark sequence in which the exercise's joint sweeps through its range `reps` times
+
+    Returns:
+        numpy.ndarray: (frames, 33, 4) array of x, y, z, visibility
+    """
+    joint, low, high = SYNTHETIC_REPS[exercise]
+    first, vertex, last = (int(landmark) for landmark in JOINTS[joint])
+
+    t = np.arange(reps * frames_per_rep + 1) / frames_per_rep
+    # Starts extended, bends to `low` mid-rep and extends again
+    angles = np.radians(low + (high - low) * (np.cos(2 * np.pi * t) + 1) / 2)
+
+    rng = np.random.default_rng(0)
+    base = np.column_stack((rng.uniform(0.3, 0.7, size=(33, 2)), np.zeros(33), np.ones(33)))
+    sequence = np.repeat(base[None], len(t), axis=0)
+    sequence[:, vertex, :2] = (0.5, 0.5)
+    sequence[:, first, :2] = (0.5, 0.3)
+    # Rotate the far landmark around the vertex, measured from the near one
+    sequence[:, last, 0] = 0.5 + 0.2 * np.sin(angles)
+    sequence[:, last, 1] = 0.5 - 0.2 * np.cos(angles)
+    return sequence
+
+
+def bench_detector(args):
+    frames = load_frames(args.video, args.frames, args.width, args.height)
+    detector = ExerciseDetector()
+    if not args.with_pose:
+        detector.pose.close()
+        detector.pose = CannedPose()
+
+    results = {'pose': 'mediapipe' if args.with_pose else 'canned'}
+    try:
+        state = {'stage': 'init', 'counter': 0}
+
+        def process(frame):
+            _, _, state['stage'], state['counter'] = detector.process_frame(
+                frame, args.exercise, state['stage'], state['counter'])
+
+        process(frames[0].copy())
+        # process_frame draws in place, so every run gets fresh copies
+        results['process_frame'] = timed(process, [frame.copy() for frame in frames])
+
+        results['render_ui'] = timed(
+            lambda frame: detector.render_ui(frame, 12, 'down', 95.0, frame.shape[1], args.exercise),
+            [frame.copy() for frame in frames])
+
+        results['detect'] = {}
+        for exercise in SYNTHETIC_REPS:
+            if args.landmarks:
+                sequence = np.load(args.landmarks, mmap_mode='r')
+            else:
+                sequence = synthetic_landmarks(exercise, args.reps)
+            stage, counter = 'init', 0
+            started = time.perf_counter()
+            for landmarks in sequence:
+                angles = detector.ANGLES.compute(landmarks)
+                _, stage, counter = detector.detect(exercise, angles, stage, counter)
+            elapsed = time.perf_counter() - started
+            results['detect'][exercise] = {
+                'us_per_frame': elapsed / len(sequence) * 1e6,
+                # A change here means rep counting behaves differently, not just faster or slower
+                'reps_counted': counter,
+            }
+    finally:
+        detector.close()
+    return results
+
+
+def seed_users(app_module, users, days):
+    """Create `users` accounts with a plan for the past `days` days and today"""
+    from werkzeug.security import generate_password_hash
+
+    from models import db, DailyWorkout, Exercise, User
+    from progress import rebuild_daily_summaries
+
+    with app_module.app.app_context():
+        db.create_all()
+        exercises = [Exercise(name=name) for name in ('squats', 'bicep_curls', 'push_ups')]
+        db.session.add_all(exercises)
+        # Hashing is deliberately slow, so every simulated user shares one hash
+        password_hash = generate_password_hash('benchmark')
+        db.session.add_all([User(name=f'User {i}', email=f'user{i}@example.com', password_hash=password_hash)
+                            for i in range(users)])
+        db.session.flush()
+
+        today = date.today()
+        db.session.add_all([
+            DailyWorkout(user_id=user_id, exercise_id=exercise.id, date=today - timedelta(days=offset),
+                         target_reps=10)
+            for user_id in range(1, users + 1) for offset in range(days) for exercise in exercises
+        ])
+        db.session.commit()
+        rebuild_daily_summaries()
+
+
+def bench_endpoints(args):
+    database = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    from config import Config
+    Config.SQLALCHEMY_DATABASE_URI = os.environ['DATABASE_URL']
+    import app as app_module
+
+    app_module.app.config['TESTING'] = True
+    seed_users(app_module, args.users, args.days)
+
+    clients = []
+    for i in range(args.users):
+        client = app_module.app.test_client()
+        response = client.post('/login', data={'email': f'user{i}@example.com', 'password': 'benchmark'})
+        if response.status_code != 302:
+            raise RuntimeError(f"Login failed for user{i}: {response.status_code}")
+        clients.append(client)
+
+    requests = [
+        ('index', lambda client, exercise_id: client.get('/')),
+        ('calendar', lambda client, exercise_id: client.get('/calendar')),
+        ('start_workout', lambda client, exercise_id: client.post('/start_workout',
+                                                                  data={'exercise_id': exercise_id})),
+        ('end_workout', lambda client, exercise_id: client.post('/end_workout')),
+    ]
+    samples = {name: [] for name, _ in requests}
+    errors = {name: 0 for name, _ in requests}
+    lock = threading.Lock()
+    next_user = iter(range(args.users * args.rounds))
+
+    def simulated_user():
+        # Each thread plays whole visits: dashboard, calendar, start and end a workout
+        while True:
+            with lock:
+                visit = next(next_user, None)
+            if visit is None:
+                return
+            client = clients[visit % args.users]
+            exercise_id = visit // args.users % 3 + 1
+            for name, request in requests:
+                started = time.perf_counter()
+                response = request(client, exercise_id)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    samples[name].append(elapsed)
+                    if response.status_code >= 400:
+                        errors[name] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=simulated_user) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {name: dict(latency_summary(samples[name]), errors=errors[name]) for name in samples}
+    results['requests_per_second'] = sum(len(values) for values in samples.values()) / elapsed
+    return results
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'args': vars(args),
+    }
+
+
+def compare(current, baseline, tolerance, path=''):
+    """
+    Walk both result trees and list metrics that regressed by more than `tolerance`
+
+    Returns:
+        list: Human-readable regression descriptions
+    """
+    regressions = []
+    for key, value in current.items():
+        name = f'{path}.{key}' if path else key
+        previous = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            regressions += compare(value, previous or {}, tolerance, name)
+        elif isinstance(value, (int, float)) and isinstance(previous, (int, float)) and previous:
+            if key.endswith(('_ms', 'us_per_frame')) and value > previous * (1 + tolerance):
+                regressions.append(f'{name}: {previous:.3f} -> {value:.3f} (slower)')
+            elif key.endswith('per_second') and value < previous * (1 - tolerance):
+                regressions.append(f'{name}: {previous:.1f} -> {value:.1f} (lower throughput)')
+            elif key in ('reps_counted', 'errors') and value != previous:
+                regressions.append(f'{name}: {previous} -> {value} (changed)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection and endpoint benchmarks with JSON output")
+    parser.add_argument('--suite', choices=('all', 'detector', 'endpoints'), default='all')
+    parser.add_argument('--video', help="Recorded clip to replay instead of synthetic frames")
+    parser.add_argument('--landmarks', help=".npy file of (frames, 33, 4) landmarks to replay through detect")
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--width', type=int, default=960)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--exercise', default='bicep_curls', help="Exercise type for process_frame")
+    parser.add_argument('--reps', type=int, default=50, help="Reps in each synthetic landmark sequence")
+    parser.add_argument('--with-pose', action='store_true',
+                        help="Include real MediaPipe inference instead of canned landmarks")
+    parser.add_argument('--users', type=int, default=20, help="Simulated users for the endpoint suite")
+    parser.add_argument('--rounds', type=int, default=3, help="Visits per simulated user")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--days', type=int, default=30, help="Days of plan history seeded per user")
+    parser.add_argument('--output', help="Write results to this file instead of stdout")
+    parser.add_argument('--baseline', help="Earlier results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    results = {'meta': metadata(args)}
+    # The app logs with print(); keep stdout for the JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.suite in ('all', 'detector'):
+            results['detector'] = bench_detector(args)
+        if args.suite in ('all', 'endpoints'):
+            results['endpoints'] = bench_endpoints(args)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare({k: v for k, v in results.items() if k != 'meta'}, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe in-process cache with a maximum size and per-entry TTL.
+
+    Args:
+        max_entries (int): Least recently used entries are evicted beyond this
+        default_ttl (float): Seconds an entry lives unless set() overrides it
+    """
+
+    def __init__(self, max_entries=10000, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemCache:
+    """
+    Cache stored as one pickle file per key in a local directory, so every
+    worker process on the host shares the same entries.
+
+    Expired entries that are never read again (e.g. keys orphaned by
+    ResponseCache invalidation) are removed by sweep(), which the owner
+    schedules every `sweep_interval` seconds off the request path.
+
+    Args:
+        directory (str): Where entries are written
+        default_ttl (float): Seconds an entry lives unless set() overrides it
+        sweep_interval (float): Seconds between sweeps, defaults to default_ttl
+    """
+
+    def __init__(self, directory, default_ttl=300, sweep_interval=None):
+        self.directory = directory
+        self.default_ttl = default_ttl
+        self.sweep_interval = sweep_interval or default_ttl or 300
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else None
+        # Write to a temporary file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((expires, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+
+    def sweep(self):
+        """
+        Remove expired entries and temporary files left by interrupted writes
+
+        Returns:
+            int: Number of files removed
+        """
+        now = time.time()
+        removed = 0
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.startswith('tmp'):
+                    expired = entry.stat().st_mtime < now - self.sweep_interval
+                else:
+                    with open(entry.path, 'rb') as f:
+                        expires = pickle.load(f)[0]
+                    expired = expires is not None and expires < now
+                if expired:
+                    os.remove(entry.path)
+                    removed += 1
+            except (OSError, EOFError, pickle.UnpicklingError):
+                # Replaced or removed by another process meanwhile
+                continue
+        return removed
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+class ResponseCache:
+    """
+    Per-user cache of view data on top of any store with get/set/delete/clear.
+
+    Each user's keys are namespaced by a generation token; invalidating a
+    user just replaces the token, which orphans all of their entries at
+    once without scanning the store. Entries carry an ETag computed from
+    their data so views can answer If-None-Match with 304.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def _generation(self, user_id):
+        generation = self.store.get(f'generation:{user_id}')
+        if generation is None:
+            # A fresh token, so entries from an evicted generation can never match again
+            generation = time.time_ns()
+            self.store.set(f'generation:{user_id}', generation, ttl=0)
+        return generation
+
+    def _key(self, user_id, key):
+        return f'user:{user_id}:{self._generation(user_id)}:{key}'
+
+    def get(self, user_id, key):
+        """Returns (data, etag), or None on a miss"""
+        return self.store.get(self._key(user_id, key))
+
+    def set(self, user_id, key, data):
+        return self._store(self._key(user_id, key), data)
+
+    def get_or_set(self, user_id, key, load):
+        """Return the cached (data, etag) for a key, calling `load()` to fill it on a miss"""
+        # The generation is read once, before loading: if the user is invalidated while `load()`
+        # runs, its possibly stale result lands under the old generation and is never served
+        store_key = self._key(user_id, key)
+        cached = self.store.get(store_key)
+        if cached is not None:
+            return cached
+        return self._store(store_key, load())
+
+    def _store(self, store_key, data):
+        etag = hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+        self.store.set(store_key, (data, etag))
+        return data, etag
+
+    def invalidate_user(self, user_id):
+        self.store.set(f'generation:{user_id}', time.time_ns(), ttl=0)
+
+    def invalidate_users(self, user_ids):
+        for user_id in user_ids:
+            self.invalidate_user(user_id)
+
+    def clear(self):
+        self.store.clear()
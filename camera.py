@@ -0,0 +1,146 @@
+import threading
+
+import cv2
+
+
+def open_video_capture(source, width=960, height=720):
+    cap = cv2.VideoCapture(source)
+
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    return cap
+
+
+class SharedCapture:
+    """
+    A single capture device read by one background thread. The latest frame
+    is published to every subscriber, so each frame is decoded exactly once
+    no matter how many viewers are attached.
+
+    Frames are shared between subscribers, so they are published read-only.
+    """
+
+    def __init__(self, source, open_capture):
+        self.source = source
+        self.open_capture = open_capture
+        self.subscribers = 0
+        self.frame = None
+        self.frame_id = 0
+        self.failed = False
+        self.running = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+
+    def wait_for_frame(self, last_frame_id, timeout=1.0):
+        """
+        Block until a frame newer than `last_frame_id` is available
+
+        Returns:
+            tuple: (frame id, frame) or (last_frame_id, None) if the capture failed or stopped
+        """
+        with self._cond:
+            while self.frame_id == last_frame_id and self.running and not self.failed:
+                if not self._cond.wait(timeout):
+                    break
+            if self.frame_id == last_frame_id or self.failed:
+                return last_frame_id, None
+            return self.frame_id, self.frame
+
+    def _capture_loop(self):
+        cap = self.open_capture(self.source)
+        try:
+            while self.running:
+                success, frame = cap.read()
+                with self._cond:
+                    if not success:
+                        print(f"Error: Failed to capture frame from source {self.source}.")
+                        self.failed = True
+                        self._cond.notify_all()
+                        break
+                    frame.flags.writeable = False
+                    self.frame = frame
+                    self.frame_id += 1
+                    self._cond.notify_all()
+        finally:
+            cap.release()
+            print(f"Video capture released for source {self.source}.")
+
+
+class CameraSubscription:
+    """
+    Subscriber view of a SharedCapture with the same read()/release() API as
+    cv2.VideoCapture. Unlike VideoCapture, read() hands back the shared,
+    read-only frame; a caller that draws on it copies it first, so
+    consumers that only read (e.g. landmark streams) never pay for a copy.
+    """
+
+    def __init__(self, broker, capture):
+        self.broker = broker
+        self.capture = capture
+        self.last_frame_id = 0
+        self.released = False
+
+    def read(self):
+        while not self.released:
+            frame_id, frame = self.capture.wait_for_frame(self.last_frame_id)
+            if frame is not None:
+                self.last_frame_id = frame_id
+                return True, frame
+            if self.capture.failed or not self.capture.running:
+                break
+        return False, None
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.broker.unsubscribe(self.capture)
+
+
+class CameraBroker:
+    """
+    Owns one SharedCapture per video source, reference-counted by subscriber.
+    The device is opened by the first subscriber and released when the last
+    one leaves.
+
+    Args:
+        open_capture (callable): Opens a source and returns a cv2.VideoCapture-like object
+    """
+
+    def __init__(self, open_capture=open_video_capture):
+        self.open_capture = open_capture
+        self._captures = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, source):
+        with self._lock:
+            capture = self._captures.get(source)
+            if capture is None or capture.failed:
+                capture = SharedCapture(source, self.open_capture)
+                self._captures[source] = capture
+                capture.start()
+            capture.subscribers += 1
+        return CameraSubscription(self, capture)
+
+    def unsubscribe(self, capture):
+        with self._lock:
+            capture.subscribers -= 1
+            if capture.subscribers > 0:
+                return
+            if self._captures.get(capture.source) is capture:
+                del self._captures[capture.source]
+        capture.stop()
+
+    def subscriber_count(self, source):
+        with self._lock:
+            capture = self._captures.get(source)
+            return capture.subscribers if capture else 0
@@ -2,7 +2,133 @@ import os
 
 class Config:
     SECRET_KEY = 'your-secret-key-here'
+
+    # Authentication
+    USER_CACHE_SIZE = 10000  # Logged-in user identities kept in memory
+    USER_CACHE_TTL = 60  # Seconds before a cached identity is reloaded from the database
+    PASSWORD_WORKERS = 2  # Password hashes computed at once
+    PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'  # werkzeug method and parameters; other hashes are upgraded on login
+    PASSWORD_TIMEOUT = 10  # Seconds a login waits for a hashing worker
     BASE_DIR = os.path.abspath(os.getcwd())  # Get the absolute path of the current working directory
-    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(BASE_DIR, 'instance', 'workout_tracker.db')}"
+    # Set DATABASE_URL to use a server database (e.g. postgresql://...) instead of the local SQLite file
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'DATABASE_URL',
+        f"sqlite:///{os.path.join(BASE_DIR, 'instance', 'workout_tracker.db')}"
+    )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool sizing
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # Seconds
+    # An in-memory SQLite database lives on a single static connection, which takes no pool options
+    SQLITE_IN_MEMORY = SQLALCHEMY_DATABASE_URI in ('sqlite://', 'sqlite:///:memory:') or \
+        'mode=memory' in SQLALCHEMY_DATABASE_URI
+    SQLALCHEMY_ENGINE_OPTIONS = {} if SQLITE_IN_MEMORY else {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True,
+    }
+
+    # Applied to every new SQLite connection; WAL lets readers proceed while a writer commits
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,  # Milliseconds to wait on a locked database
+        'mmap_size': 256 * 1024 * 1024,
+    }
     VIDEO_SOURCE = 0  # Default webcam
+    CAMERA_WIDTH = 960
+    CAMERA_HEIGHT = 720
+
+    # Concurrent workout sessions
+    SESSION_IDLE_TIMEOUT = 300  # Seconds before an abandoned workout is evicted
+    SESSION_EVICT_INTERVAL = 60  # Seconds between sweeps for abandoned workouts
+    DETECTOR_POOL_SIZE = 4  # Idle detectors kept around for reuse
+    # Pose inference processes shared by live sessions (e.g. one per core); 0 infers in the web process
+    POSE_WORKERS = int(os.environ.get('POSE_WORKERS', 0))
+    POSE_WORKER_SLOTS = 4  # Frames each worker can have in flight
+    POSE_WORKER_TIMEOUT = 5  # Seconds to wait for a frame's landmarks
+    REP_CHECKPOINT_INTERVAL = 5  # Seconds between writes of live rep counts to the database
+    STREAM_CLIENT_QUEUE_SIZE = 2  # Encoded frames buffered per viewer before dropping the oldest
+    # 'video' streams server-rendered JPEGs; 'landmarks' streams packed landmarks the browser draws itself;
+    # 'browser' captures in the browser and uploads frames to /ingest_frame for inference
+    STREAM_MODE = os.environ.get('STREAM_MODE', 'video')
+    STREAM_LOCAL_PREVIEW = False  # In landmarks mode, show the browser's own camera under the overlay
+    STREAM_DEBUG_OVERLAY = os.environ.get('STREAM_DEBUG_OVERLAY') == '1'  # Draw stage timings onto the video
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED') == '1'  # Serve Prometheus metrics on /metrics
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # If set, scrapers must send 'Authorization: Bearer <token>'
+
+    # Inference on frames uploaded by browsers
+    INGEST_WORKERS = 4  # Concurrent inference threads shared by all uploading sessions
+    INGEST_BATCH_SIZE = 8
+    INGEST_BATCH_WINDOW = 0.005  # Seconds to wait for more sessions to fill a batch
+    INGEST_MAX_FPS = 15  # Per-session upload rate limit
+    INGEST_BURST = 5
+    INGEST_FRAME_WIDTH = 480  # Browsers downscale to this width before uploading
+    INGEST_JPEG_QUALITY = 0.7
+    INGEST_MAX_FRAME_BYTES = 512 * 1024
+    INGEST_TIMEOUT = 5  # Seconds an upload waits for its result
+
+    # Pose inference budgets selectable per session; None runs full-resolution inference on every frame
+    INFERENCE_MODES = {
+        'full': None,
+        'balanced': {'inference_width': 480, 'max_inference_fps': 15,
+                     'motion_threshold': 12, 'interpolate': True},
+        'economy': {'inference_width': 320, 'max_inference_fps': 10, 'every_n': 3,
+                    'motion_threshold': 20},
+    }
+    DEFAULT_INFERENCE_MODE = 'full'
+
+    # How each exercise is counted, keyed by Exercise.name. A rep starts with the joint extended;
+    # count_on picks whether flexing past `flexed` ('flex') or extending back past `extended`
+    # ('extend') completes it. New exercises only need an entry here.
+    EXERCISE_DEFINITIONS = {
+        'squats': {'joint': 'left_knee', 'extended': 155, 'flexed': 90, 'count_on': 'extend',
+                   'progress_range': (90, 160), 'aliases': ['squat']},
+        'push_ups': {'joint': 'left_elbow', 'extended': 160, 'flexed': 60, 'count_on': 'flex',
+                     'progress_range': (25, 178), 'aliases': ['pushup', 'push_up']},
+        'bicep_curls': {'joint': 'left_elbow', 'extended': 160, 'flexed': 40, 'count_on': 'flex',
+                        'progress_range': (30, 160), 'aliases': ['bicep_curl']},
+    }
+
+    # Video stream encodings selectable per session; None streams the capture size at JPEG quality 95
+    STREAM_PRESETS = {
+        'full': None,
+        'balanced': {'width': 640, 'quality': 75, 'max_fps': 20},
+        'economy': {'width': 480, 'quality': 60, 'max_fps': 10},
+    }
+    DEFAULT_STREAM_PRESET = 'full'
+
+    # Offline video analysis
+    UPLOAD_FOLDER = os.path.join(BASE_DIR, 'instance', 'uploads')
+    VIDEO_CHUNK_SECONDS = 10  # Length of the time range each pool worker processes
+    VIDEO_WARMUP_FRAMES = 15  # Frames before each chunk used to re-establish pose tracking
+    ANALYSIS_WORKERS = None  # Pool size, None uses every CPU
+
+    # Record every live session's landmarks for replay with rep_engine.py
+    RECORD_LANDMARKS = os.environ.get('RECORD_LANDMARKS') == '1'
+    LANDMARK_LOG_DIR = os.path.join(BASE_DIR, 'instance', 'landmark_logs')
+
+    # Nightly job planning every user's workouts ahead
+    PLAN_JOB_ENABLED = True
+    PLAN_SCHEDULE = {'hour': 2, 'minute': 0}  # APScheduler cron fields, in PLAN_TIMEZONE
+    PLAN_TIMEZONE = 'Europe/Berlin'
+    PLAN_DAYS_AHEAD = 7
+    PLAN_BATCH_SIZE = 1000  # Users per transaction
+    PLAN_DEFAULT_TARGET_REPS = 10  # Target for an exercise a user has never been planned
+
+    # Incomplete-workout reminders, recomputed for all users in the background
+    REMINDER_INTERVAL_MINUTES = 15
+    # 'log' prints reminders, 'file' appends them as JSON lines to REMINDER_OUTBOX, None doesn't send them
+    REMINDER_CHANNEL = os.environ.get('REMINDER_CHANNEL', 'log')
+    REMINDER_OUTBOX = os.path.join(BASE_DIR, 'instance', 'reminders.jsonl')
+
+    PROGRESS_MAX_DAYS = 366  # Longest range /progress serves in one request
+
+    # Dashboard/calendar response cache: 'memory' is per process, 'filesystem' is shared by all local workers
+    RESPONSE_CACHE_TYPE = os.environ.get('RESPONSE_CACHE_TYPE', 'memory')
+    RESPONSE_CACHE_DIR = os.path.join(BASE_DIR, 'instance', 'cache')
+    RESPONSE_CACHE_TTL = 300  # Seconds
+    RESPONSE_CACHE_SIZE = 10000  # Entries kept by the in-memory cache
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Tests never touch instance/workout_tracker.db. Config reads the URL when it's first imported,
+# which happens while test modules are still being collected, so it's set here.
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, text
+
+from models import db, DailyWorkout
+
+# Hot queries issued by the app's endpoints, keyed by the endpoint that runs them
+QUERIES = {
+    'index': "SELECT * FROM daily_tasks WHERE user_id = :user_id AND date = :day",
+    'start_end_workout': ("SELECT * FROM daily_tasks WHERE user_id = :user_id "
+                          "AND exercise_id = :exercise_id AND date = :day"),
+    'calendar': ("SELECT * FROM daily_tasks WHERE user_id = :user_id "
+                 "AND date >= :month_start AND date <= :month_end"),
+    'reminders': "SELECT COUNT(*) FROM daily_tasks WHERE date = :day AND is_completed = 0",
+}
+
+
+def build_table(engine, users, days, exercises):
+    """Create daily_tasks without its indexes and fill it with users * days * exercises rows"""
+    table = DailyWorkout.__table__
+    db.metadata.create_all(engine, tables=[table])
+    with engine.begin() as conn:
+        for index in table.indexes:
+            index.drop(conn)
+
+    start = date.today() - timedelta(days=days - 1)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for user_id in range(1, users + 1):
+            cursor.executemany(
+                "INSERT INTO daily_tasks (user_id, exercise_id, date, target_reps, completed_reps, is_completed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(user_id, exercise_id, (start + timedelta(days=offset)).isoformat(), 10, 10, 1)
+                 for offset in range(days) for exercise_id in range(1, exercises + 1)]
+            )
+        raw.commit()
+    finally:
+        raw.close()
+    return start
+
+
+def time_queries(engine, users, exercises, start, days, iterations):
+    rng = random.Random(0)
+    results = {}
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            statement = text(sql)
+            elapsed = 0.0
+            for _ in range(iterations):
+                day = start + timedelta(days=rng.randrange(days))
+                params = {
+                    'user_id': rng.randint(1, users),
+                    'exercise_id': rng.randint(1, exercises),
+                    'day': day.isoformat(),
+                    'month_start': day.replace(day=1).isoformat(),
+                    'month_end': (day.replace(day=1) + timedelta(days=31)).isoformat(),
+                }
+                began = time.perf_counter()
+                conn.execute(statement, params).fetchall()
+                elapsed += time.perf_counter() - began
+            plan = conn.execute(text('EXPLAIN QUERY PLAN ' + sql), params).fetchall()
+            results[name] = {
+                'ms_per_query': elapsed / iterations * 1000,
+                'plan': ' / '.join(row[-1] for row in plan),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark daily_tasks lookups with and without indexes")
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--exercises', type=int, default=3)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'daily_tasks_benchmark.db')
+    engine = create_engine(f'sqlite:///{path}')
+
+    began = time.perf_counter()
+    start = build_table(engine, args.users, args.days, args.exercises)
+    rows = args.users * args.days * args.exercises
+    print(f"Inserted {rows:,} rows in {time.perf_counter() - began:.1f}s")
+
+    results = {'rows': rows}
+    results['before'] = time_queries(engine, args.users, args.exercises, start, args.days, args.iterations)
+
+    began = time.perf_counter()
+    with engine.begin() as conn:
+        for index in DailyWorkout.__table__.indexes:
+            index.create(conn)
+    results['index_build_seconds'] = time.perf_counter() - began
+    results['after'] = time_queries(engine, args.users, args.exercises, start, args.days, args.iterations)
+
+    engine.dispose()
+    os.remove(path)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"Built indexes in {results['index_build_seconds']:.1f}s")
+    for name in QUERIES:
+        before, after = results['before'][name], results['after'][name]
+        print(f"{name:>18}: {before['ms_per_query']:9.3f} ms -> {after['ms_per_query']:7.3f} ms  "
+              f"({after['plan']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from config import Config
+from models import db, configure_engine
+
+# What end_workout and get_calendar do against daily_tasks
+WRITE_SQL = text(
+    "UPDATE daily_tasks SET completed_reps = completed_reps + 1, "
+    "is_completed = completed_reps + 1 >= target_reps "
+    "WHERE user_id = :user_id AND date = :day AND exercise_id = :exercise_id"
+)
+READ_SQL = text(
+    "SELECT daily_tasks.date, exercises.name, target_reps, completed_reps, is_completed "
+    "FROM daily_tasks JOIN exercises ON daily_tasks.exercise_id = exercises.id "
+    "WHERE user_id = :user_id AND date >= :month_start AND date <= :month_end"
+)
+
+
+def seed(engine, users, days):
+    db.metadata.create_all(engine)
+    start = date.today() - timedelta(days=days - 1)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO exercises (id, name) VALUES (1, 'squats'), (2, 'bicep_curls'), "
+                          "(3, 'push_ups')"))
+        conn.execute(text("INSERT INTO users (id, name, email, password_hash) VALUES (:id, 'user', :email, '')"),
+                     [{'id': user_id, 'email': f'user{user_id}@example.com'} for user_id in range(1, users + 1)])
+        conn.execute(text("INSERT INTO daily_tasks (user_id, exercise_id, date, target_reps, completed_reps, "
+                          "is_completed) VALUES (:user_id, :exercise_id, :day, 20, 0, 0)"),
+                     [{'user_id': user_id, 'exercise_id': exercise_id,
+                       'day': (start + timedelta(days=offset)).isoformat()}
+                      for user_id in range(1, users + 1) for offset in range(days)
+                      for exercise_id in (1, 2, 3)])
+    return start
+
+
+def run_load(engine, users, start, days, readers, writers, seconds):
+    """
+    Hammer the database with concurrent calendar reads and end_workout writes
+
+    Returns:
+        dict: Operations per second and errors for each side
+    """
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0}
+    lock = threading.Lock()
+
+    def worker(kind, seed_value):
+        rng = random.Random(seed_value)
+        done = errors = 0
+        while not stop.is_set():
+            day = start + timedelta(days=rng.randrange(days))
+            try:
+                if kind == 'writes':
+                    with engine.begin() as conn:
+                        conn.execute(WRITE_SQL, {'user_id': rng.randint(1, users), 'day': day.isoformat(),
+                                                 'exercise_id': rng.randint(1, 3)})
+                else:
+                    with engine.connect() as conn:
+                        conn.execute(READ_SQL, {'user_id': rng.randint(1, users),
+                                                'month_start': day.replace(day=1).isoformat(),
+                                                'month_end': (day + timedelta(days=31)).isoformat()}).fetchall()
+                done += 1
+            except OperationalError:
+                errors += 1
+        with lock:
+            counts[kind] += done
+            counts[kind[:-1] + '_errors'] += errors
+
+    threads = [threading.Thread(target=worker, args=('reads', i)) for i in range(readers)]
+    threads += [threading.Thread(target=worker, args=('writes', 1000 + i)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'reads_per_second': counts['reads'] / seconds,
+        'writes_per_second': counts['writes'] / seconds,
+        'read_errors': counts['read_errors'],
+        'write_errors': counts['write_errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read throughput under concurrent writes, default vs tuned SQLite")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ('default', 'tuned'):
+        path = os.path.join(tempfile.mkdtemp(), f'{mode}.db')
+        engine = create_engine(f'sqlite:///{path}', pool_size=args.readers + args.writers,
+                               connect_args={'timeout': 5})
+        if mode == 'tuned':
+            configure_engine(engine, Config.SQLITE_PRAGMAS)
+        start = seed(engine, args.users, args.days)
+        results[mode] = run_load(engine, args.users, start, args.days,
+                                 args.readers, args.writers, args.seconds)
+        engine.dispose()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for mode, result in results.items():
+        print(f"{mode:>8}: {result['reads_per_second']:8.0f} reads/s  {result['writes_per_second']:6.0f} writes/s  "
+              f"errors r/w {result['read_errors']}/{result['write_errors']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,53 @@
 import cv2
 import mediapipe as mp
-import math
 import numpy as np
 import time
+from mediapipe.framework.formats import landmark_pb2
+
+import rep_engine
+from pose_angles import landmarks_to_array
+
+
+class InferenceBudget:
+    """
+    Limits how much pose inference a session spends per frame.
+
+    Args:
+        inference_width (int): Width the frame is downscaled to before pose inference (None keeps full size)
+        every_n (int): Run pose inference at most every Nth frame (None disables the frame limit)
+        max_inference_fps (float): Run pose inference at most this often (None disables the rate limit)
+        motion_threshold (float): Mean grayscale change since the last inference that forces an early run
+        interpolate (bool): Extrapolate landmarks from the last two inferences on skipped frames
+    """
+
+    def __init__(self, inference_width=None, every_n=None, max_inference_fps=None,
+                 motion_threshold=None, interpolate=False):
+        self.inference_width = inference_width
+        self.every_n = every_n
+        self.max_inference_fps = max_inference_fps
+        self.motion_threshold = motion_threshold
+        self.interpolate = interpolate
+
 
 class ExerciseDetector:
-    def __init__(self):
+    # Size of the thumbnail used to estimate motion between inferences
+    MOTION_SIZE = (64, 48)
+
+    # Every joint angle is computed once per frame; the rep engine indexes into the result
+    ANGLES = rep_engine.ANGLES
+
+    POSE_OPTIONS = {'min_detection_confidence': 0.5, 'min_tracking_confidence': 0.5}
+
+    def __init__(self, budget=None, pose=None):
+        """
+        Args:
+            budget (InferenceBudget): See configure()
+            pose: Object with MediaPipe Pose's process/reset/close, e.g. a pose_workers.RemotePose;
+                None builds a local MediaPipe Pose
+        """
         self.mp_pose = mp.solutions.pose
         self.mp_drawing = mp.solutions.drawing_utils
-        self.pose = self.mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+        self.pose = pose or self.mp_pose.Pose(**self.POSE_OPTIONS)
         
         # Color definitions
         self.WHITE = (255, 255, 255)
@@ -17,63 +56,197 @@ class ExerciseDetector:
         self.RED = (0, 0, 255)
         self.BLUE = (245, 117, 25)
 
-    def calculate_angle(self, a, b, c):
-        a = np.array(a)
-        b = np.array(b)
-        c = np.array(c)
-        radians = math.atan2(c[1] - b[1], c[0] - b[0]) - math.atan2(a[1] - b[1], a[0] - b[0])
-        angle = np.abs(radians * 180.0 / math.pi)
-        return angle if angle <= 180.0 else 360 - angle
+        self.landmark_spec = self.mp_drawing.DrawingSpec(color=(245,117,66), thickness=2, circle_radius=2)
+        self.connection_spec = self.mp_drawing.DrawingSpec(color=(245,66,230), thickness=2, circle_radius=2)
+
+        # Reused between frames so the hot loop doesn't allocate full-size images
+        self._rgb_buffer = None
+        self._inference_buffer = None
+        self._landmark_array = np.empty((33, 4), dtype=np.float64)
+
+        # Landmarks (33 x [x, y, z, visibility]) and angle vector of the latest frame, None if no pose
+        self.landmarks = None
+        self.angles = None
+
+        self.configure(budget)
+
+    def configure(self, budget):
+        """Set the inference budget (None runs full-resolution inference on every frame)"""
+        self.budget = budget
+        self._frames_since_inference = 0
+        self._last_pose = None  # (landmarks, timestamp) of the latest inference
+        self._previous_pose = None
+        self._motion_reference = None
+
+    def reset(self):
+        """Clear pose tracking state so the detector can be reused for another session"""
+        self.pose.reset()
+        self.configure(None)
+
+    def close(self):
+        self.pose.close()
 
-    def process_frame(self, frame, exercise_type, stage, counter):
+    def process_frame(self, frame, exercise, stage, counter):
         """
-        Process a single frame for exercise detection
+        Process a single frame for exercise detection. Landmarks are drawn
+        onto `frame` in place, so callers sharing a frame must pass a copy.
         
         Args:
-            frame (numpy.ndarray): Input video frame
-            exercise_type (str): Type of exercise to detect
+            frame (numpy.ndarray): Input BGR video frame
+            exercise (ExerciseRule): Compiled rule from rep_engine.lookup (a name works too)
         
         Returns:
             tuple: Processed frame, detected landmarks, exercise metrics
         """
 
-        # Convert frame to RGB for MediaPipe processing
-        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        image.flags.writeable = False
-        
-        # Detect pose landmarks
-        results = self.pose.process(image)
-        
-        # Convert back to BGR
-        image.flags.writeable = True
-        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        pose_landmarks, angles = self.estimate_angles(frame)
         
+        # Draw on the original BGR frame instead of converting back
+        image = frame
         angle = 0  # Default angle
         
-        if results.pose_landmarks:
-            landmarks = results.pose_landmarks.landmark
-            
-            # Detect exercise based on type
-            if exercise_type == 'bicep_curls':
-                angle, stage, counter = self.detect_bicep_curl(landmarks, stage, counter)
-            elif exercise_type == 'squat':
-                angle, stage, counter = self.detect_squat(landmarks, stage, counter)
-            elif exercise_type == 'pushup':
-                angle, stage, counter = self.detect_pushup(landmarks, stage, counter)
+        if pose_landmarks:
+            angle, stage, counter = self.detect(exercise, angles, stage, counter)
             
             # Render landmarks and connections
-            self.mp_drawing.draw_landmarks(
-                image, 
-                results.pose_landmarks, 
-                self.mp_pose.POSE_CONNECTIONS,
-                self.mp_drawing.DrawingSpec(color=(245,117,66), thickness=2, circle_radius=2),
-                self.mp_drawing.DrawingSpec(color=(245,66,230), thickness=2, circle_radius=2)
-            )
+            self.draw_pose(image, pose_landmarks)
         
         return image, angle, stage, counter
+
+    def draw_pose(self, image, pose_landmarks):
+        """Draw landmarks and connections onto a BGR frame in place"""
+        self.mp_drawing.draw_landmarks(
+            image, 
+            pose_landmarks, 
+            self.mp_pose.POSE_CONNECTIONS,
+            self.landmark_spec,
+            self.connection_spec
+        )
+
+    def estimate_angles(self, frame):
+        """
+        Run pose estimation on a BGR frame without drawing anything
+
+        Returns:
+            tuple: MediaPipe pose landmarks and the joint angle vector, or (None, None) if no pose was found
+        """
+        # Detect pose landmarks
+        if self.budget is None:
+            pose_landmarks = self._infer(frame)
+        else:
+            pose_landmarks = self._estimate_pose(frame)
+
+        if not pose_landmarks:
+            self.landmarks = self.angles = None
+            return None, None
+
+        self.landmarks = landmarks_to_array(pose_landmarks.landmark, self._landmark_array)
+        self.angles = self.ANGLES.compute(self.landmarks)
+        return pose_landmarks, self.angles
+
+    def detect(self, exercise, angles, stage, counter):
+        """
+        Advance the rep state machine of an exercise by one frame
+
+        Args:
+            exercise (ExerciseRule): Compiled rule from rep_engine.lookup (a name works too)
+
+        Returns:
+            tuple: angle, stage, counter
+        """
+        return rep_engine.detect(exercise, angles, stage, counter)
+
+    def _to_rgb(self, frame):
+        buffer = self._rgb_buffer
+        if buffer is None or buffer.shape != frame.shape:
+            buffer = self._rgb_buffer = np.empty_like(frame)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buffer)
+
+    def _infer(self, frame):
+        """Run MediaPipe on a BGR frame, converting it to RGB in a reusable buffer"""
+        image = self._to_rgb(frame)
+        image.flags.writeable = False
+        pose_landmarks = self.pose.process(image).pose_landmarks
+        image.flags.writeable = True
+        return pose_landmarks
+
+    def _estimate_pose(self, frame):
+        """Run pose inference only when the budget allows it, otherwise reuse the last landmarks"""
+        budget = self.budget
+        now = time.monotonic()
+        self._frames_since_inference += 1
+
+        motion_image = None
+        if budget.motion_threshold is not None:
+            motion_image = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY),
+                                      self.MOTION_SIZE, interpolation=cv2.INTER_AREA)
+
+        if not self._inference_due(now, motion_image):
+            if budget.interpolate:
+                return self._extrapolate_pose(now)
+            return self._last_pose[0]
+
+        # Landmarks are normalized, so inferring on a downscaled frame needs no rescaling.
+        # Downscaling first means only the inference input is converted to RGB.
+        height, width = frame.shape[:2]
+        if budget.inference_width and budget.inference_width < width:
+            size = (budget.inference_width, int(height * budget.inference_width / width))
+            buffer = self._inference_buffer
+            if buffer is None or buffer.shape[1::-1] != size:
+                buffer = self._inference_buffer = np.empty((size[1], size[0], 3), dtype=frame.dtype)
+            frame = cv2.resize(frame, size, dst=buffer, interpolation=cv2.INTER_AREA)
+
+        pose_landmarks = self._infer(frame)
+
+        self._previous_pose = self._last_pose
+        self._last_pose = (pose_landmarks, now)
+        self._frames_since_inference = 0
+        self._motion_reference = motion_image
+        return pose_landmarks
+
+    def _inference_due(self, now, motion_image):
+        budget = self.budget
+        if self._last_pose is None:
+            return True
+
+        if motion_image is not None and self._motion_reference is not None:
+            if cv2.absdiff(motion_image, self._motion_reference).mean() > budget.motion_threshold:
+                return True
+
+        frames_due = budget.every_n is None or self._frames_since_inference >= budget.every_n
+        time_due = (budget.max_inference_fps is None or
+                    now - self._last_pose[1] >= 1.0 / budget.max_inference_fps)
+        return frames_due and time_due
+
+    def _extrapolate_pose(self, now):
+        """Linearly extend the motion between the last two inferences to the current time"""
+        last, last_time = self._last_pose
+        if self._previous_pose is None or last is None or self._previous_pose[0] is None:
+            return last
+
+        previous, previous_time = self._previous_pose
+        # Never project further ahead than the gap between the two inferences
+        step = min((now - last_time) / max(last_time - previous_time, 1e-6), 1.0)
+
+        return landmark_pb2.NormalizedLandmarkList(landmark=[
+            landmark_pb2.NormalizedLandmark(
+                x=cur.x + (cur.x - prev.x) * step,
+                y=cur.y + (cur.y - prev.y) * step,
+                z=cur.z + (cur.z - prev.z) * step,
+                visibility=cur.visibility
+            )
+            for cur, prev in zip(last.landmark, previous.landmark)
+        ])
        
 
-    def render_ui(self, image, counter, stage, angle, width, exercise_type):
+    def progress(self, angle, exercise):
+        """Position of the angle within the exercise's range, in percent"""
+        rule = rep_engine.lookup(exercise)
+        if rule is None:
+            return 0.0
+        return rule.progress(angle)
+
+    def render_ui(self, image, counter, stage, angle, width, exercise):
         """
         Render UI elements on the frame
         
@@ -83,27 +256,19 @@ class ExerciseDetector:
             stage (str): Current exercise stage
             angle (float): Calculated joint angle
             width (int): Frame width
-            exercise_type (str): Type of exercise
+            exercise (ExerciseRule): Compiled rule from rep_engine.lookup (a name works too)
         
         Returns:
             numpy.ndarray: Frame with UI elements
         """
-        # Exercise-specific angle ranges
-        exercise_configs = {
-            'pushup': {'max_angle': 178, 'min_angle': 25},
-            'squat': {'max_angle': 160, 'min_angle': 90},
-            'bicep_curl': {'max_angle': 160, 'min_angle': 30}
-        }
-        
-        config = exercise_configs.get(exercise_type, 
-                                      {'max_angle': 178, 'min_angle': 25})
-        
         # Title and background
         cv2.rectangle(image, 
                       (int(width/2) - 150, 0), 
                       (int(width/2) + 250, 73), 
                       self.BLUE, -1)
-        cv2.putText(image, f'{exercise_type.upper()} Tracker', 
+        rule = rep_engine.lookup(exercise)
+        title = rule.title if rule is not None else str(exercise).upper()
+        cv2.putText(image, f'{title} Tracker', 
                     (int(width/2) - 100, 50), 
                     cv2.FONT_HERSHEY_SIMPLEX, 1, 
                     self.WHITE, 2, cv2.LINE_AA)
@@ -126,8 +291,7 @@ class ExerciseDetector:
                     self.WHITE, 2, cv2.LINE_AA)
         
         # Progress bar
-        progress = ((angle - config['min_angle']) / 
-                    (config['max_angle'] - config['min_angle'])) * 100
+        progress = self.progress(angle, rule)
         cv2.rectangle(image, 
                       (50, 350), 
                       (50 + int(progress * 2), 370), 
@@ -139,69 +303,3 @@ class ExerciseDetector:
                     self.WHITE, 2, cv2.LINE_AA)
         
         return image
-
-    def detect_pushup(self, landmarks, stage, counter):
-        """Pushup-specific detection logic"""
-        shoulder = [landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER.value].y]
-        elbow = [landmarks[self.mp_pose.PoseLandmark.LEFT_ELBOW.value].x,
-                landmarks[self.mp_pose.PoseLandmark.LEFT_ELBOW.value].y]
-        wrist = [landmarks[self.mp_pose.PoseLandmark.LEFT_WRIST.value].x,
-                landmarks[self.mp_pose.PoseLandmark.LEFT_WRIST.value].y]
-        
-        angle = self.calculate_angle(shoulder, elbow, wrist)
-        
-        # Stage logic
-        if angle > 160:  # Fully extended position
-            if stage == "down":  # Transition from down to up
-                stage = "up"
-        elif angle < 60:  # Fully bent position
-            if stage == "up":  # Transition from up to down
-                stage = "down"
-                counter += 1  # Increment counter on valid rep
-        
-        return angle, stage, counter
-
-    def detect_squat(self, landmarks, stage, counter):
-        """Squat-specific detection logic"""
-        hip = [landmarks[self.mp_pose.PoseLandmark.LEFT_HIP.value].x,
-            landmarks[self.mp_pose.PoseLandmark.LEFT_HIP.value].y]
-        knee = [landmarks[self.mp_pose.PoseLandmark.LEFT_KNEE.value].x,
-                landmarks[self.mp_pose.PoseLandmark.LEFT_KNEE.value].y]
-        ankle = [landmarks[self.mp_pose.PoseLandmark.LEFT_ANKLE.value].x,
-                landmarks[self.mp_pose.PoseLandmark.LEFT_ANKLE.value].y]
-        
-        angle = self.calculate_angle(hip, knee, ankle)
-        
-        # Stage logic
-        if angle > 155:  # Fully standing
-            if stage == "down":  # Transition from down to up
-                stage = "up"
-                counter += 1  # Increment counter on valid rep
-        elif angle < 90:  # Fully squatted
-            if stage == "up":  # Transition from up to down
-                stage = "down"
-        
-        return angle, stage, counter
-
-    def detect_bicep_curl(self, landmarks, stage, counter):
-        """Bicep Curl-specific detection logic"""
-        shoulder = [landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER.value].y]
-        elbow = [landmarks[self.mp_pose.PoseLandmark.LEFT_ELBOW.value].x,
-                landmarks[self.mp_pose.PoseLandmark.LEFT_ELBOW.value].y]
-        wrist = [landmarks[self.mp_pose.PoseLandmark.LEFT_WRIST.value].x,
-                landmarks[self.mp_pose.PoseLandmark.LEFT_WRIST.value].y]
-        
-        angle = self.calculate_angle(shoulder, elbow, wrist)
-        
-        # Stage logic
-        if angle > 160:  # Fully extended
-            if stage == "down" or stage == "init":  # Transition from down to up
-                stage = "up"
-        elif angle < 40:  # Fully bent
-            if stage == "up":  # Transition from up to down
-                stage = "down"
-                counter += 1  # Increment counter on valid rep
-        
-        return angle, stage, counter
\ No newline at end of file
@@ -0,0 +1,188 @@
+import argparse
+import json
+import math
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+from exercise_detection import ExerciseDetector
+
+
+class CannedPose:
+    """Stands in for MediaPipe Pose so the benchmark measures only our own per-frame work"""
+
+    class Results:
+        def __init__(self, pose_landmarks):
+            self.pose_landmarks = pose_landmarks
+
+    def __init__(self):
+        rng = np.random.default_rng(0)
+        points = rng.uniform(0.2, 0.8, size=(33, 2))
+        self.results = self.Results(landmark_pb2.NormalizedLandmarkList(landmark=[
+            landmark_pb2.NormalizedLandmark(x=x, y=y, z=0.0, visibility=1.0) for x, y in points
+        ]))
+
+    def process(self, image):
+        return self.results
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def legacy_calculate_angle(a, b, c):
+    a = np.array(a)
+    b = np.array(b)
+    c = np.array(c)
+    radians = math.atan2(c[1] - b[1], c[0] - b[0]) - math.atan2(a[1] - b[1], a[0] - b[0])
+    angle = np.abs(radians * 180.0 / math.pi)
+    return angle if angle <= 180.0 else 360 - angle
+
+
+def legacy_frame(detector, frame, exercise_type, stage, counter):
+    """The per-frame path as it was before buffer reuse, kept here as the baseline"""
+    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    image.flags.writeable = False
+    results = detector.pose.process(image)
+    image.flags.writeable = True
+    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+    angle = 0
+    if results.pose_landmarks:
+        landmarks = results.pose_landmarks.landmark
+        pose_landmark = detector.mp_pose.PoseLandmark
+        shoulder = [landmarks[pose_landmark.LEFT_SHOULDER.value].x,
+                    landmarks[pose_landmark.LEFT_SHOULDER.value].y]
+        elbow = [landmarks[pose_landmark.LEFT_ELBOW.value].x,
+                 landmarks[pose_landmark.LEFT_ELBOW.value].y]
+        wrist = [landmarks[pose_landmark.LEFT_WRIST.value].x,
+                 landmarks[pose_landmark.LEFT_WRIST.value].y]
+        angle = legacy_calculate_angle(shoulder, elbow, wrist)
+
+        detector.mp_drawing.draw_landmarks(
+            image,
+            results.pose_landmarks,
+            detector.mp_pose.POSE_CONNECTIONS,
+            detector.mp_drawing.DrawingSpec(color=(245,117,66), thickness=2, circle_radius=2),
+            detector.mp_drawing.DrawingSpec(color=(245,66,230), thickness=2, circle_radius=2)
+        )
+
+    # render_ui used to rebuild its config table every frame
+    exercise_configs = {
+        'pushup': {'max_angle': 178, 'min_angle': 25},
+        'squat': {'max_angle': 160, 'min_angle': 90},
+        'bicep_curl': {'max_angle': 160, 'min_angle': 30}
+    }
+    exercise_configs.get(exercise_type, {'max_angle': 178, 'min_angle': 25})
+    image = detector.render_ui(image, counter, stage, angle, image.shape[1], exercise_type)
+    return image, angle, stage, counter
+
+
+def current_frame(detector, frame, exercise_type, stage, counter):
+    if not frame.flags.writeable:
+        # A shared capture frame; copy it before drawing, as FramePipeline does for video clients
+        frame = frame.copy()
+    image, angle, stage, counter = detector.process_frame(frame, exercise_type, stage, counter)
+    image = detector.render_ui(image, counter, stage, angle, image.shape[1], exercise_type)
+    return image, angle, stage, counter
+
+
+def measure(step, detector, frames, exercise_type, shared=False):
+    """
+    Run `step` over the frames twice: once timed, once under tracemalloc
+
+    Args:
+        shared (bool): Hand the frames over read-only, as the shared capture does, so any copy
+            the step needs before drawing is measured too
+
+    Returns:
+        dict: Mean ms/frame and mean peak bytes allocated per frame
+    """
+    # Each frame is copied beforehand since a step may draw on a frame it owns
+    inputs = [frame.copy() for frame in frames]
+    for frame in inputs:
+        frame.flags.writeable = not shared
+    stage, counter = 'init', 0
+    start = time.perf_counter()
+    for frame in inputs:
+        _, _, stage, counter = step(detector, frame, exercise_type, stage, counter)
+    elapsed = time.perf_counter() - start
+
+    inputs = [frame.copy() for frame in frames]
+    for frame in inputs:
+        frame.flags.writeable = not shared
+    peaks = []
+    tracemalloc.start()
+    for frame in inputs:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        step(detector, frame, exercise_type, stage, counter)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    return {
+        'ms_per_frame': elapsed / len(frames) * 1000,
+        'bytes_per_frame': sum(peaks) / len(peaks),
+    }
+
+
+def load_frames(video, count, width, height):
+    if video:
+        cap = cv2.VideoCapture(video)
+        frames = []
+        while len(frames) < count:
+            success, frame = cap.read()
+            if not success:
+                break
+            frames.append(frame)
+        cap.release()
+        if frames:
+            return frames
+        print(f"Could not read {video}, falling back to synthetic frames")
+
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame detection micro-benchmark")
+    parser.add_argument('--video', help="Recorded clip to replay instead of synthetic frames")
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--width', type=int, default=960)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--exercise', default='bicep_curls')
+    parser.add_argument('--with-pose', action='store_true',
+                        help="Include real MediaPipe inference instead of canned landmarks")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames, args.width, args.height)
+    detector = ExerciseDetector()
+    if not args.with_pose:
+        detector.pose.close()
+        detector.pose = CannedPose()
+
+    # Warm up buffers and any lazy initialization before measuring
+    current_frame(detector, frames[0].copy(), args.exercise, 'init', 0)
+
+    results = {
+        'before': measure(legacy_frame, detector, frames, args.exercise),
+        # The legacy path read its own capture; the current one reads the shared, read-only frames
+        'after': measure(current_frame, detector, frames, args.exercise, shared=True),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, result in results.items():
+        print(f"{name:>6}: {result['ms_per_frame']:.3f} ms/frame, "
+              f"{result['bytes_per_frame'] / 1024:.1f} KiB allocated/frame")
+
+
+if __name__ == '__main__':
+    main()
@@ -12,7 +12,7 @@ def main():
         return
     
     # Set exercise type
-    exercise_type = 'bicep_curl'
+    exercise_type = 'bicep_curls'
     print(f"Starting {exercise_type} detection. Press 'q' to quit.")
     
     # Initialize variables
@@ -30,8 +30,8 @@ def main():
         height, width, _ = frame.shape
         
         # Process the frame
-        processed_frame, results, angle, stage, counter = detector.process_frame(
-            frame, exercise_type
+        processed_frame, angle, stage, counter = detector.process_frame(
+            frame, exercise_type, stage, current_reps
         )
 
         print(stage, angle, counter)
@@ -60,6 +60,7 @@ def main():
     
     # Release the capture and close windows
     cap.release()
+    detector.close()
     cv2.destroyAllWindows()
 
 if __name__ == "__main__":
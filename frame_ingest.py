@@ -0,0 +1,203 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from frame_pipeline import run_inference
+from metrics import RollingHistogram
+
+
+class IngestError(Exception):
+    """An uploaded frame was rejected; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing `rate` events per second on average with bursts of
+    up to `burst`. Not thread-safe; callers hold their own lock.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class _SessionState:
+    def __init__(self, workout, bucket):
+        self.workout = workout
+        self.bucket = bucket
+        self.last_sequence = -1
+        # (sequence, data, future, submitted at) of the newest frame not yet handed to a worker
+        self.pending = None
+        self.in_flight = False
+
+
+class InferenceScheduler:
+    """
+    Pose inference service for frames uploaded by browsers.
+
+    Uploads from every session land in one scheduler; a dispatcher thread
+    spreads the sessions with a frame waiting over the free workers of a
+    fixed inference pool, so the number of concurrent MediaPipe graphs
+    running stays bounded however many users are uploading. Each free
+    worker gets an equal share of the waiting frames, and only once more
+    sessions are waiting than there are free workers do they share a batch.
+    Each session has at most one frame in flight and only its newest frame
+    waits behind it, so results come back in order and a slow server sheds
+    stale frames instead of queueing them.
+
+    Args:
+        workers (int): Inference threads
+        batch_size (int): Most frames handed to a worker at once
+        batch_window (float): Seconds the dispatcher waits for more sessions before handing the last
+            free worker a batch smaller than batch_size
+        max_fps (float): Per-session upload rate limit
+        burst (int): Frames a session may send back to back before the rate limit applies
+    """
+
+    def __init__(self, workers=4, batch_size=8, batch_window=0.005, max_fps=15, burst=5):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_fps = max_fps
+        self.burst = burst
+
+        self.processed = 0
+        self.superseded = 0
+        self.rate_limited = 0
+        self.wait_times = RollingHistogram()
+        self.inference_times = RollingHistogram()
+
+        self._states = {}
+        self._cond = threading.Condition()
+        # Batches are only formed while a worker is free, so frames keep coalescing under load
+        self._slots = threading.Semaphore(workers)
+        self._idle_workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest')
+        self.running = True
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, workout, sequence, data):
+        """
+        Queue an encoded frame (JPEG or PNG bytes) for a session
+
+        Args:
+            workout (WorkoutSession): Session the frame belongs to
+            sequence (int): Client-assigned frame number, increasing per session
+
+        Returns:
+            Future: Resolves to the packed landmark frame (see landmark_codec) or raises IngestError
+        """
+        with self._cond:
+            state = self._states.get(workout)
+            if state is None:
+                state = _SessionState(workout, TokenBucket(self.max_fps, self.burst))
+                self._states[workout] = state
+
+            if sequence <= state.last_sequence:
+                raise IngestError("Frame is older than one already received", 409)
+            if not state.bucket.take():
+                self.rate_limited += 1
+                raise IngestError("Frame rate limit exceeded", 429)
+            state.last_sequence = sequence
+
+            if state.pending is not None:
+                # Only the newest waiting frame is worth inferring
+                state.pending[2].set_exception(IngestError("Superseded by a newer frame", 409))
+                self.superseded += 1
+
+            future = Future()
+            state.pending = (sequence, data, future, time.monotonic())
+            self._cond.notify()
+        return future
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False)
+
+    def _ready(self):
+        ready = [state for state in self._states.values() if state.pending is not None and not state.in_flight]
+        # Oldest waiting frame first, so no session starves
+        ready.sort(key=lambda state: state.pending[3])
+        return ready
+
+    def _dispatch_loop(self):
+        while True:
+            self._slots.acquire()
+            with self._cond:
+                while self.running and not self._ready():
+                    self._cond.wait(0.5)
+                    self._forget_ended()
+                if not self.running:
+                    return
+                # Only the last free worker waits to fill its batch; otherwise waiting sessions are better
+                # served by the workers sitting idle
+                if self.batch_window and self._idle_workers == 1 and len(self._ready()) < self.batch_size:
+                    self._cond.wait(self.batch_window)
+
+                ready = self._ready()
+                # Split the waiting sessions evenly over the free workers, this one included
+                share = min(-(-len(ready) // self._idle_workers), self.batch_size)
+                batch = []
+                for state in ready[:share]:
+                    batch.append((state, state.pending))
+                    state.pending = None
+                    state.in_flight = True
+                self._idle_workers -= 1
+            self._executor.submit(self._run_batch, batch)
+
+    def _forget_ended(self):
+        for workout, state in list(self._states.items()):
+            if not workout.active and state.pending is None and not state.in_flight:
+                del self._states[workout]
+
+    def _run_batch(self, batch):
+        try:
+            for state, (sequence, data, future, submitted) in batch:
+                started = time.monotonic()
+                try:
+                    future.set_result(self._infer(state.workout, sequence, data))
+                except Exception as e:
+                    future.set_exception(e)
+                finally:
+                    finished = time.monotonic()
+                    with self._cond:
+                        state.in_flight = False
+                        self.processed += 1
+                        self.wait_times.observe(started - submitted)
+                        self.inference_times.observe(finished - started)
+                        self._cond.notify()
+        finally:
+            with self._cond:
+                self._idle_workers += 1
+            self._slots.release()
+
+    def _infer(self, workout, sequence, data):
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise IngestError("Could not decode frame", 400)
+
+        result = run_inference(workout, frame, workout.exercise_rule, draw=False, sequence=sequence)
+        if result is None:
+            raise IngestError("Workout has ended", 404)
+        return result[4]
@@ -0,0 +1,404 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from landmark_codec import pack_frame
+from metrics import PipelineMetrics
+
+FRAME_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+FRAME_TRAILER = b'\r\n'
+
+
+class FrameQueue:
+    """
+    Bounded queue that drops the oldest item when full, so a slow consumer
+    always sees the most recent frames instead of an ever-growing backlog.
+    """
+
+    def __init__(self, maxsize=2):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self.closed:
+                return
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the next item, or None on timeout or once the queue is closed and drained"""
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class StreamPreset:
+    """
+    How a session's video stream is encoded.
+
+    Args:
+        width (int): Width frames are downscaled to before encoding (None keeps the capture size)
+        quality (int): JPEG quality, 0-100
+        max_fps (float): Encode at most this many frames per second (None encodes every frame)
+    """
+
+    def __init__(self, width=None, quality=95, max_fps=None):
+        self.width = width
+        self.quality = quality
+        self.max_fps = max_fps
+
+
+class FrameEncoder:
+    """
+    Turns rendered frames into multipart JPEG chunks according to a preset,
+    reusing the downscale buffer between frames.
+    """
+
+    def __init__(self, preset=None):
+        self.preset = preset or StreamPreset()
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, self.preset.quality]
+        self._resized = None
+
+    def encode(self, frame):
+        """
+        Returns:
+            bytes: The multipart chunk, or None if encoding failed
+        """
+        height, width = frame.shape[:2]
+        target_width = self.preset.width
+        if target_width and target_width < width:
+            size = (target_width, int(height * target_width / width))
+            if self._resized is None or self._resized.shape[1::-1] != size:
+                self._resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            cv2.resize(frame, size, dst=self._resized, interpolation=cv2.INTER_LINEAR)
+            frame = self._resized
+
+        ret, buffer = cv2.imencode('.jpg', frame, self.params)
+        if not ret:
+            return None
+        # One copy straight from the encoder's buffer into the chunk
+        return b''.join((FRAME_HEADER, buffer, FRAME_TRAILER))
+
+
+class StreamStats:
+    """
+    Encoder counters for one pipeline. Only the encode thread writes them.
+
+    Args:
+        window (int): Number of recent frames encode time is averaged over
+    """
+
+    def __init__(self, window=100):
+        self.started = time.monotonic()
+        self.encoded_frames = 0
+        self.skipped_frames = 0
+        self.bytes_encoded = 0
+        self.bytes_delivered = 0
+        self._encode_times = deque(maxlen=window)
+
+    def record(self, size, seconds, clients):
+        self.encoded_frames += 1
+        self.bytes_encoded += size
+        self.bytes_delivered += size * clients
+        self._encode_times.append(seconds)
+
+    def as_dict(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        times = list(self._encode_times)
+        return {
+            'encoded_frames': self.encoded_frames,
+            'skipped_frames': self.skipped_frames,
+            'encode_ms_per_frame': 1000 * sum(times) / len(times) if times else 0.0,
+            'bytes_per_frame': self.bytes_encoded / self.encoded_frames if self.encoded_frames else 0.0,
+            'bytes_per_second': self.bytes_encoded / elapsed,
+            'delivered_bytes_per_second': self.bytes_delivered / elapsed,
+        }
+
+
+def run_inference(workout, frame, exercise, draw=True, sequence=None, metrics=None):
+    """
+    Run one frame through the session's detector and advance its rep state
+
+    Args:
+        workout (WorkoutSession): Session whose detector and rep state are used
+        frame (numpy.ndarray): BGR frame; only written to when `draw` is set
+        exercise (ExerciseRule): Compiled rule of the exercise being tracked
+        draw (bool): Draw the landmarks onto `frame` in place, so it must be writeable
+        sequence (int): If given, also pack the result with landmark_codec under this sequence number
+        metrics (PipelineMetrics): Records pose and draw latency when given
+
+    Returns:
+        tuple: (frame, angle, stage, counter, packed payload or None), or None if the workout has ended
+    """
+    with workout.detector_lock:
+        detector = workout.detector
+        if not workout.active or detector is None:
+            return None
+        reps, stage, _ = workout.snapshot()
+
+        started = time.perf_counter()
+        pose_landmarks, angles = detector.estimate_angles(frame)
+        pose_done = time.perf_counter()
+
+        if workout.recorder is not None:
+            workout.recorder.write(time.time(), detector.landmarks)
+
+        angle, counter = 0, reps
+        if angles is not None:
+            angle, stage, counter = detector.detect(exercise, angles, stage, reps)
+            if draw:
+                detector.draw_pose(frame, pose_landmarks)
+
+        payload = None
+        if sequence is not None:
+            # Pack while holding the lock; the landmark array is reused by the next frame
+            payload = pack_frame(sequence, int(time.time() * 1000), counter, stage, angle,
+                                 detector.progress(angle, exercise), detector.landmarks)
+
+    if metrics is not None:
+        metrics.observe('pose', pose_done - started)
+        if draw:
+            metrics.observe('draw', time.perf_counter() - pose_done)
+    workout.update(angle, stage, counter)
+    return frame, angle, stage, counter, payload
+
+
+class FramePipeline:
+    """
+    Staged video pipeline for one workout session:
+
+        capture thread -> inference worker -> render/encode worker -> client queues
+
+    Each stage runs in its own thread and hands off through a drop-oldest
+    queue, so the stages overlap and a slow stage or client never backs up
+    the camera.
+
+    Clients subscribe either to 'video' (multipart JPEG chunks) or to
+    'landmarks' (packed per-frame landmarks and metrics, see landmark_codec)
+    for browsers that draw the overlay themselves. Drawing, rendering and
+    encoding are skipped entirely while no video client is attached.
+
+    Args:
+        workout (WorkoutSession): Session whose detector and rep state are used
+        open_capture (callable): Returns an object with read() and release()
+        client_queue_size (int): Frames buffered per connected client
+        preset (StreamPreset): Encoding settings for video clients (None keeps the capture size at quality 95)
+        debug_overlay (bool): Draw stage latencies and frame rates onto the video
+    """
+
+    def __init__(self, workout, open_capture, client_queue_size=2, preset=None, debug_overlay=False):
+        self.workout = workout
+        self.open_capture = open_capture
+        self.client_queue_size = client_queue_size
+        self.preset = preset or StreamPreset()
+        self.stats = StreamStats()
+        self.metrics = PipelineMetrics()
+        self.debug_overlay = debug_overlay
+        self._debug_lines = []
+        self._debug_refreshed = 0
+        # Drops counted by client queues that have since been detached
+        self._detached_client_drops = 0
+
+        self._inference_queue = FrameQueue(maxsize=1)
+        self._render_queue = FrameQueue(maxsize=1)
+        self._clients = []
+        self._landmark_clients = []
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._threads = []
+        self.running = False
+
+    def start(self):
+        self.running = True
+        for target in (self._capture_loop, self._inference_loop, self._encode_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self._inference_queue.close()
+        self._render_queue.close()
+        with self._lock:
+            clients = self._clients + self._landmark_clients
+            self._clients, self._landmark_clients = [], []
+        for client in clients:
+            client.close()
+
+    def subscribe(self, client=None, kind='video'):
+        """
+        Attach a client queue, creating a FrameQueue if none is given. Any
+        object with put() and close() works, e.g. an asyncio-side queue.
+
+        Args:
+            kind (str): 'video' for JPEG chunks or 'landmarks' for packed landmark frames
+        """
+        if client is None:
+            client = FrameQueue(maxsize=self.client_queue_size)
+        with self._lock:
+            self._client_list(kind).append(client)
+        return client
+
+    def unsubscribe(self, client):
+        """Detach a client; the pipeline stops once the last client leaves"""
+        client.close()
+        with self._lock:
+            for clients in (self._clients, self._landmark_clients):
+                if client in clients:
+                    clients.remove(client)
+                    self._detached_client_drops += client.dropped
+            idle = not self._clients and not self._landmark_clients
+        if idle:
+            self.stop()
+
+    def client_count(self):
+        with self._lock:
+            return len(self._clients) + len(self._landmark_clients)
+
+    def dropped_frames(self):
+        """Frames dropped so far at each hand-off, by queue"""
+        with self._lock:
+            clients = self._clients + self._landmark_clients
+            client_drops = self._detached_client_drops + sum(client.dropped for client in clients)
+        return {
+            'inference': self._inference_queue.dropped,
+            'render': self._render_queue.dropped,
+            'client': client_drops,
+            'encode_skipped': self.stats.skipped_frames,
+        }
+
+    def _client_list(self, kind):
+        if kind == 'video':
+            return self._clients
+        if kind == 'landmarks':
+            return self._landmark_clients
+        raise ValueError(f"Unknown stream kind '{kind}'")
+
+    def _capture_loop(self):
+        cap = self.open_capture()
+        try:
+            while self.running and self.workout.active:
+                started = time.perf_counter()
+                success, frame = cap.read()
+                if not success:
+                    print("Error: Failed to capture frame.")
+                    break
+                self.metrics.observe('capture', time.perf_counter() - started)
+                self.metrics.mark('capture')
+                self._inference_queue.put(frame)
+        finally:
+            cap.release()
+            self.stop()
+            print("Workout ended or video capture released.")
+            if self.stats.encoded_frames:
+                stats = self.stats.as_dict()
+                print(f"Stream: {stats['encoded_frames']} frames, "
+                      f"{stats['encode_ms_per_frame']:.1f} ms/frame encode, "
+                      f"{stats['bytes_per_second'] / 1024:.0f} KiB/s")
+
+    def _inference_loop(self):
+        workout = self.workout
+        exercise = workout.exercise_rule
+        while self.running:
+            frame = self._inference_queue.get(timeout=0.5)
+            if frame is None:
+                continue
+
+            with self._lock:
+                want_video = bool(self._clients)
+                landmark_clients = list(self._landmark_clients)
+            if want_video and not frame.flags.writeable:
+                # Shared capture frames are read-only; only video clients need a copy to draw on
+                frame = frame.copy()
+
+            result = run_inference(workout, frame, exercise, draw=want_video,
+                                   sequence=self._sequence if landmark_clients else None,
+                                   metrics=self.metrics)
+            if result is None:
+                break
+            self.metrics.mark('inference')
+            processed_frame, angle, stage, counter, payload = result
+
+            self._sequence += 1
+            for client in landmark_clients:
+                client.put(payload)
+            if want_video:
+                self._render_queue.put((processed_frame, counter, stage, angle))
+
+    def _encode_loop(self):
+        workout = self.workout
+        encoder = FrameEncoder(self.preset)
+        interval = 1.0 / self.preset.max_fps if self.preset.max_fps else 0
+        last_encoded = None
+
+        while self.running:
+            item = self._render_queue.get(timeout=0.5)
+            if item is None:
+                continue
+
+            with self._lock:
+                clients = list(self._clients)
+            started = time.perf_counter()
+            # Nobody to send to, or over the preset's frame rate: don't render or encode
+            if not clients or (last_encoded is not None and started - last_encoded < interval):
+                self.stats.skipped_frames += 1
+                continue
+            last_encoded = started
+
+            # The detector goes back to the pool when the session ends and may be leased to another one,
+            # so it is looked up per frame; render_ui itself only reads drawing constants
+            detector = workout.detector
+            if not workout.active or detector is None:
+                break
+            processed_frame, counter, stage, angle = item
+            processed_frame = detector.render_ui(
+                processed_frame, counter, stage, angle,
+                processed_frame.shape[1], workout.exercise_rule
+            )
+            if self.debug_overlay:
+                self._draw_debug_overlay(processed_frame)
+
+            encode_started = time.perf_counter()
+            self.metrics.observe('render', encode_started - started)
+            chunk = encoder.encode(processed_frame)
+            if chunk is None:
+                continue
+            encode_seconds = time.perf_counter() - encode_started
+            self.metrics.observe('encode', encode_seconds)
+            self.metrics.mark('encode')
+            self.stats.record(len(chunk), encode_seconds, len(clients))
+
+            for client in clients:
+                client.put(chunk)
+
+    def _draw_debug_overlay(self, image):
+        # Percentiles are recomputed once a second, not per frame
+        now = time.perf_counter()
+        if now - self._debug_refreshed > 1.0:
+            medians, rates = self.metrics.summary()
+            self._debug_lines = [f'{stage} {ms:.1f} ms' for stage, ms in medians.items()]
+            self._debug_lines += [f'{name} {fps:.1f} fps' for name, fps in rates.items()]
+            self._debug_refreshed = now
+
+        top = image.shape[0] - 20 * len(self._debug_lines) - 10
+        for i, line in enumerate(self._debug_lines):
+            cv2.putText(image, line, (image.shape[1] - 200, top + 20 * i),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1, cv2.LINE_AA)
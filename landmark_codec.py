@@ -0,0 +1,69 @@
+import struct
+
+import numpy as np
+
+# Wire format of one frame, little-endian (mirrored by static/js/landmark_overlay.js):
+#
+#   header   B version, B flags, I sequence, I timestamp ms, H reps, B stage, f angle, f progress
+#   body     33 x (h x, h y, B visibility) when FLAG_LANDMARKS is set
+#
+# x and y are normalized image coordinates in fixed point (1.0 == COORD_SCALE),
+# visibility is scaled to 0-255. A frame with a pose is 186 bytes.
+VERSION = 1
+FLAG_LANDMARKS = 1
+COORD_SCALE = 16384
+NUM_LANDMARKS = 33
+
+HEADER = struct.Struct('<BBIIHBff')
+LANDMARK_DTYPE = np.dtype([('x', '<i2'), ('y', '<i2'), ('visibility', 'u1')])
+
+STAGES = ['init', 'up', 'down']
+STAGE_CODES = {stage: code for code, stage in enumerate(STAGES)}
+
+
+def pack_frame(sequence, timestamp_ms, reps, stage, angle, progress, landmarks=None):
+    """
+    Pack one frame's metrics and landmarks into the binary wire format
+
+    Args:
+        landmarks (numpy.ndarray): (33, 4) array of x, y, z, visibility, or None if no pose was found
+    """
+    flags = FLAG_LANDMARKS if landmarks is not None else 0
+    header = HEADER.pack(VERSION, flags, sequence & 0xFFFFFFFF, timestamp_ms & 0xFFFFFFFF,
+                         min(reps, 0xFFFF), STAGE_CODES.get(stage, 0), angle, progress)
+    if landmarks is None:
+        return header
+
+    body = np.empty(NUM_LANDMARKS, dtype=LANDMARK_DTYPE)
+    body['x'] = np.clip(landmarks[:, 0] * COORD_SCALE, -32768, 32767)
+    body['y'] = np.clip(landmarks[:, 1] * COORD_SCALE, -32768, 32767)
+    body['visibility'] = np.clip(landmarks[:, 3] * 255, 0, 255)
+    return header + body.tobytes()
+
+
+def unpack_frame(payload):
+    """
+    Inverse of pack_frame, for tests and offline tools
+
+    Returns:
+        dict: sequence, timestamp_ms, reps, stage, angle, progress and landmarks ((33, 3) x, y, visibility or None)
+    """
+    version, flags, sequence, timestamp_ms, reps, stage, angle, progress = HEADER.unpack_from(payload)
+    if version != VERSION:
+        raise ValueError(f"Unsupported landmark frame version {version}")
+
+    landmarks = None
+    if flags & FLAG_LANDMARKS:
+        body = np.frombuffer(payload, dtype=LANDMARK_DTYPE, count=NUM_LANDMARKS, offset=HEADER.size)
+        landmarks = np.column_stack((body['x'] / COORD_SCALE, body['y'] / COORD_SCALE,
+                                     body['visibility'] / 255.0))
+
+    return {
+        'sequence': sequence,
+        'timestamp_ms': timestamp_ms,
+        'reps': reps,
+        'stage': STAGES[stage] if stage < len(STAGES) else 'init',
+        'angle': angle,
+        'progress': progress,
+        'landmarks': landmarks,
+    }
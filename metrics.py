@@ -0,0 +1,219 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class RollingHistogram:
+    """
+    Latency samples over a sliding window of the most recent observations.
+    Recording is a single array store; percentiles are only computed when
+    someone asks for them.
+
+    Args:
+        window (int): Number of recent samples kept
+    """
+
+    def __init__(self, window=512):
+        self._samples = np.zeros(window, dtype=np.float64)
+        self._next = 0
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self._samples[self._next] = value
+        self._next = (self._next + 1) % len(self._samples)
+        self.count += 1
+        self.total += value
+
+    @classmethod
+    def combine(cls, histograms):
+        """One histogram holding the windows and totals of all the given ones"""
+        histograms = list(histograms)
+        windows = [histogram._samples[:min(histogram.count, len(histogram._samples))] for histogram in histograms]
+        combined = cls(window=max(sum(len(window) for window in windows), 1))
+        filled = np.concatenate(windows) if windows else combined._samples[:0]
+        combined._samples[:len(filled)] = filled
+        combined._next = len(filled) % len(combined._samples)
+        combined.count = sum(histogram.count for histogram in histograms)
+        combined.total = sum(histogram.total for histogram in histograms)
+        return combined
+
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)):
+        """
+        Returns:
+            dict: quantile -> value over the window, empty if nothing was recorded
+        """
+        filled = self._samples[:min(self.count, len(self._samples))]
+        if not len(filled):
+            return {}
+        return dict(zip(quantiles, np.quantile(filled, quantiles)))
+
+
+class RateMeter:
+    """Events per second over the most recent `window` events"""
+
+    def __init__(self, window=60):
+        self._times = deque(maxlen=window)
+
+    def mark(self, now=None):
+        self._times.append(time.perf_counter() if now is None else now)
+
+    def rate(self):
+        times = list(self._times)
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+
+class PipelineMetrics:
+    """
+    Per-stage latency histograms and throughput meters for one session's
+    frame pipeline. Each stage is written by a single pipeline thread, so
+    the histograms take no locks; only the process-wide totals do.
+    """
+
+    STAGES = ('capture', 'pose', 'draw', 'render', 'encode')
+    RATES = ('capture', 'inference', 'encode')
+
+    # (count, seconds) per stage over every pipeline since the process started, so exported
+    # totals keep growing when a session ends instead of dropping with its histogram
+    _totals = {stage: (0, 0.0) for stage in STAGES}
+    _totals_lock = threading.Lock()
+
+    def __init__(self, window=512):
+        self.stages = {stage: RollingHistogram(window) for stage in self.STAGES}
+        self.rates = {name: RateMeter() for name in self.RATES}
+
+    def observe(self, stage, seconds):
+        self.stages[stage].observe(seconds)
+        with self._totals_lock:
+            count, total = self._totals[stage]
+            self._totals[stage] = (count + 1, total + seconds)
+
+    @classmethod
+    def stage_totals(cls, stage):
+        """
+        Returns:
+            tuple: (observations, seconds) recorded for the stage by every pipeline in this process
+        """
+        with cls._totals_lock:
+            return cls._totals[stage]
+
+    def mark(self, name):
+        self.rates[name].mark()
+
+    def summary(self):
+        """Median stage latency in ms and current rates, for the debug overlay"""
+        medians = {stage: histogram.percentiles((0.5,)).get(0.5, 0.0) * 1000
+                   for stage, histogram in self.stages.items()}
+        rates = {name: meter.rate() for name, meter in self.rates.items()}
+        return medians, rates
+
+
+class PrometheusWriter:
+    """Accumulates metric families in the Prometheus text exposition format"""
+
+    def __init__(self, prefix='workfit_'):
+        self.prefix = prefix
+        # Samples of a family must be contiguous, so lines are grouped by family name
+        self._families = {}
+
+    def _family(self, name, kind, help_text):
+        lines = self._families.get(name)
+        if lines is None:
+            lines = self._families[name] = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        return lines
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ''
+        return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+    def sample(self, name, kind, help_text, value, **labels):
+        name = self.prefix + name
+        self._family(name, kind, help_text).append(f'{name}{self._labels(labels)} {float(value)}')
+
+    def summary(self, name, help_text, histogram, totals=None, **labels):
+        """
+        Args:
+            totals (tuple): (count, sum) to export instead of the histogram's own, which must never decrease
+        """
+        name = self.prefix + name
+        lines = self._family(name, 'summary', help_text)
+        for quantile, value in histogram.percentiles().items():
+            lines.append(f'{name}{self._labels(dict(labels, quantile=quantile))} {float(value)}')
+        count, total = totals or (histogram.count, histogram.total)
+        lines.append(f'{name}_sum{self._labels(labels)} {total}')
+        lines.append(f'{name}_count{self._labels(labels)} {count}')
+
+    def render(self):
+        return '\n'.join(line for lines in self._families.values() for line in lines) + '\n'
+
+
+def collect_metrics(sessions, ingest=None, plans=None):
+    """
+    Render the metrics of the active sessions (and the upload scheduler and plan job).
+    Sessions are aggregated rather than labelled by user, so the output neither reveals
+    who is working out nor grows a series per user.
+
+    Args:
+        sessions (SessionRegistry): Active workouts
+        ingest (InferenceScheduler): Shared inference for uploaded frames
+        plans (PlanRoller): Nightly plan generation
+
+    Returns:
+        str: Prometheus text exposition
+    """
+    out = PrometheusWriter()
+    workouts = sessions.all()
+    out.sample('active_sessions', 'gauge', "Workout sessions currently active", len(workouts))
+
+    pipelines = [workout.pipeline for workout in workouts
+                 if workout.pipeline is not None and workout.pipeline.running]
+    out.sample('streaming_sessions', 'gauge', "Sessions with a running video pipeline", len(pipelines))
+    for stage in PipelineMetrics.STAGES:
+        # Quantiles cover the running pipelines; _sum and _count everything since the process started
+        out.summary('stage_seconds', "Per-frame latency of each video pipeline stage, across sessions",
+                    RollingHistogram.combine(pipeline.metrics.stages[stage] for pipeline in pipelines),
+                    totals=PipelineMetrics.stage_totals(stage), stage=stage)
+    if pipelines:
+        for name in PipelineMetrics.RATES:
+            fps = sum(pipeline.metrics.rates[name].rate() for pipeline in pipelines)
+            out.sample('pipeline_fps', 'gauge', "Frames per second through each pipeline stage, summed over sessions",
+                       fps, stage=name)
+        dropped = {}
+        for pipeline in pipelines:
+            for queue, count in pipeline.dropped_frames().items():
+                dropped[queue] = dropped.get(queue, 0) + count
+        # A gauge, not a counter: the sum falls whenever a session ends
+        for queue, count in dropped.items():
+            out.sample('frames_dropped', 'gauge', "Frames dropped so far by the running pipelines because a "
+                       "consumer fell behind", count, queue=queue)
+        out.sample('stream_clients', 'gauge', "Clients attached to the running pipelines",
+                   sum(pipeline.client_count() for pipeline in pipelines))
+
+    if ingest is not None:
+        out.summary('ingest_wait_seconds', "Time an uploaded frame waits for a worker", ingest.wait_times)
+        out.summary('ingest_inference_seconds', "Decode and pose inference time of an uploaded frame",
+                    ingest.inference_times)
+        out.sample('ingest_frames_total', 'counter', "Uploaded frames processed", ingest.processed)
+        out.sample('ingest_superseded_total', 'counter', "Uploaded frames replaced by a newer one",
+                   ingest.superseded)
+        out.sample('ingest_rate_limited_total', 'counter', "Uploaded frames rejected by the rate limit",
+                   ingest.rate_limited)
+
+    if plans is not None:
+        out.sample('plan_runs_total', 'counter', "Plan roll-forward runs", plans.runs)
+        out.sample('plan_rows_inserted_total', 'counter', "Daily workouts created by plan runs",
+                   plans.rows_inserted)
+        if plans.last_run is not None:
+            out.sample('plan_last_run_seconds', 'gauge', "Duration of the latest plan run",
+                       plans.last_run['seconds'])
+            out.sample('plan_last_run_slowest_batch_seconds', 'gauge',
+                       "Slowest user batch of the latest plan run", plans.last_run['slowest_batch_seconds'])
+            out.sample('plan_last_run_users', 'gauge', "Users covered by the latest plan run",
+                       plans.last_run['users'])
+    return out.render()
@@ -0,0 +1,67 @@
+from sqlalchemy import func
+
+from models import db, DailySummary, DailyWorkout
+from progress import rebuild_daily_summaries
+
+
+def deduplicate_daily_workouts(session):
+    """
+    Merge duplicate (user, date, exercise) rows so the unique index can be built.
+    Completed reps are summed into the oldest row so no progress is lost.
+
+    Returns:
+        int: Number of rows removed
+    """
+    duplicates = session.query(
+        DailyWorkout.user_id, DailyWorkout.date, DailyWorkout.exercise_id
+    ).group_by(
+        DailyWorkout.user_id, DailyWorkout.date, DailyWorkout.exercise_id
+    ).having(func.count(DailyWorkout.id) > 1).all()
+
+    removed = 0
+    for user_id, workout_date, exercise_id in duplicates:
+        rows = DailyWorkout.query.filter_by(
+            user_id=user_id, date=workout_date, exercise_id=exercise_id
+        ).order_by(DailyWorkout.id).all()
+        keeper, extras = rows[0], rows[1:]
+        keeper.target_reps = max(row.target_reps for row in rows)
+        keeper.completed_reps = sum(row.completed_reps or 0 for row in rows)
+        keeper.is_completed = keeper.completed_reps >= keeper.target_reps
+        for row in extras:
+            session.delete(row)
+        removed += len(extras)
+
+    session.commit()
+    return removed
+
+
+def upgrade_schema():
+    """
+    Bring an existing database up to the current models: create missing
+    tables and any indexes declared on the models that don't exist yet.
+    Safe to run repeatedly; must be called inside an app context.
+    """
+    db.create_all()
+
+    removed = deduplicate_daily_workouts(db.session)
+    if removed:
+        print(f"Removed {removed} duplicate daily workout rows")
+
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+    # Backfill the progress rollups the first time they're introduced
+    if db.session.query(DailySummary.user_id).first() is None and \
+            db.session.query(DailyWorkout.id).first() is not None:
+        print("Building daily progress summaries")
+        rebuild_daily_summaries()
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        print(f"Upgrading {db.engine.url}")
+        upgrade_schema()
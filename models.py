@@ -1,10 +1,56 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from contextlib import contextmanager
 from datetime import date, datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 
 db = SQLAlchemy()
 
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+
+def configure_engine(engine, sqlite_pragmas):
+    """Apply the given PRAGMAs to every new connection if the engine is SQLite"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in sqlite_pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+@contextmanager
+def count_queries(engine=None):
+    """
+    Count the SQL statements executed inside the block, e.g.
+
+        with count_queries() as queries:
+            client.get('/')
+        assert queries.count == 2
+
+    Args:
+        engine: Engine to watch, defaults to the app's engine (needs an app context)
+    """
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
@@ -15,8 +61,8 @@ class User(UserMixin, db.Model):
 
     daily_workouts = db.relationship('DailyWorkout', backref='user', lazy=True)
 
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+    def set_password(self, password, method='scrypt'):
+        self.password_hash = generate_password_hash(password, method)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -32,6 +78,12 @@ class Exercise(db.Model):
 
 class DailyWorkout(db.Model):
     __tablename__ = 'daily_tasks'
+    __table_args__ = (
+        # One row per user, day and exercise; also serves every user + date (+ exercise) lookup
+        db.Index('uq_daily_tasks_user_date_exercise', 'user_id', 'date', 'exercise_id', unique=True),
+        # Date-only scans across all users (reminders, plan generation)
+        db.Index('ix_daily_tasks_date', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id'), nullable=False)
@@ -40,3 +92,63 @@ class DailyWorkout(db.Model):
     completed_reps = db.Column(db.Integer, default=0)
     is_completed = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class VideoAnalysis(db.Model):
+    __tablename__ = 'video_analyses'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id'), nullable=False)
+    video_path = db.Column(db.String(512), nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, done, failed
+    total_reps = db.Column(db.Integer, default=0)
+    frame_count = db.Column(db.Integer, default=0)
+    duration = db.Column(db.Float, default=0.0)  # Seconds
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    exercise = db.relationship('Exercise')
+    reps = db.relationship('RepResult', backref='analysis', lazy=True, order_by='RepResult.rep_number')
+
+class RepResult(db.Model):
+    __tablename__ = 'rep_results'
+    id = db.Column(db.Integer, primary_key=True)
+    analysis_id = db.Column(db.Integer, db.ForeignKey('video_analyses.id'), nullable=False)
+    rep_number = db.Column(db.Integer, nullable=False)
+    timestamp = db.Column(db.Float, nullable=False)  # Seconds from the start of the video
+    angle = db.Column(db.Float, nullable=False)
+
+class WorkoutCheckpoint(db.Model):
+    """
+    Reps of one live workout already added to its daily_tasks row. Flushes
+    write the session's absolute count here and add only the difference to
+    daily_tasks, so a retried flush never counts a rep twice.
+    """
+    __tablename__ = 'workout_checkpoints'
+    __table_args__ = (
+        db.Index('ix_workout_checkpoints_user_active', 'user_id', 'is_active'),
+    )
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    reps = db.Column(db.Integer, default=0, nullable=False)
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class ReminderDelivery(db.Model):
+    """A user's incomplete-workout reminder was sent for that day; shared by every process"""
+    __tablename__ = 'reminder_deliveries'
+    date = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    delivered_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class DailySummary(db.Model):
+    """Per user per day rollup of daily_tasks, kept in sync whenever reps are recorded"""
+    __tablename__ = 'daily_summaries'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    exercise_count = db.Column(db.Integer, default=0, nullable=False)
+    completed_exercises = db.Column(db.Integer, default=0, nullable=False)
+    target_reps = db.Column(db.Integer, default=0, nullable=False)
+    completed_reps = db.Column(db.Integer, default=0, nullable=False)
+    is_completed = db.Column(db.Boolean, default=False, nullable=False)
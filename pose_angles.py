@@ -0,0 +1,106 @@
+from enum import IntEnum
+
+import numpy as np
+
+NUM_LANDMARKS = 33
+
+
+class PoseLandmark(IntEnum):
+    """BlazePose landmark indices, as in mediapipe.solutions.pose.PoseLandmark"""
+    LEFT_SHOULDER = 11
+    RIGHT_SHOULDER = 12
+    LEFT_ELBOW = 13
+    RIGHT_ELBOW = 14
+    LEFT_WRIST = 15
+    RIGHT_WRIST = 16
+    LEFT_HIP = 23
+    RIGHT_HIP = 24
+    LEFT_KNEE = 25
+    RIGHT_KNEE = 26
+    LEFT_ANKLE = 27
+    RIGHT_ANKLE = 28
+
+# Joint angles measured at the middle landmark of each triplet
+JOINTS = {
+    'left_elbow': (PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_ELBOW, PoseLandmark.LEFT_WRIST),
+    'right_elbow': (PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_ELBOW, PoseLandmark.RIGHT_WRIST),
+    'left_shoulder': (PoseLandmark.LEFT_ELBOW, PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_HIP),
+    'right_shoulder': (PoseLandmark.RIGHT_ELBOW, PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_HIP),
+    'left_hip': (PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_HIP, PoseLandmark.LEFT_KNEE),
+    'right_hip': (PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_HIP, PoseLandmark.RIGHT_KNEE),
+    'left_knee': (PoseLandmark.LEFT_HIP, PoseLandmark.LEFT_KNEE, PoseLandmark.LEFT_ANKLE),
+    'right_knee': (PoseLandmark.RIGHT_HIP, PoseLandmark.RIGHT_KNEE, PoseLandmark.RIGHT_ANKLE),
+}
+
+
+def landmarks_to_array(landmarks, out=None):
+    """
+    Pack MediaPipe landmarks into a (33, 4) array of x, y, z, visibility
+
+    Args:
+        landmarks: `pose_landmarks.landmark` sequence from a MediaPipe result
+        out (numpy.ndarray): Optional (33, 4) array to fill instead of allocating
+    """
+    if out is None:
+        out = np.empty((NUM_LANDMARKS, 4), dtype=np.float64)
+    for i, landmark in enumerate(landmarks):
+        out[i] = (landmark.x, landmark.y, landmark.z, landmark.visibility)
+    return out
+
+
+class AngleEngine:
+    """
+    Computes every configured joint angle from a landmark array in one
+    vectorized pass.
+
+    The output vector holds the 2D (image plane) angle of each joint followed
+    by its 3D angle, in the order of `names`; use `index()` to look one up.
+    Inputs may be a single (33, 4) frame or any batch of shape (..., 33, 4),
+    e.g. (frames, 33, 4) for offline analysis.
+
+    Args:
+        joints (dict): Joint name -> (first, middle, last) landmark triplet
+    """
+
+    def __init__(self, joints=JOINTS):
+        self.joints = list(joints)
+        self.names = self.joints + [f'{name}_3d' for name in self.joints]
+        self._positions = {name: i for i, name in enumerate(self.names)}
+
+        triplets = np.array([[int(point) for point in joints[name]] for name in self.joints])
+        self._first, self._middle, self._last = triplets.T
+
+    def index(self, name):
+        return self._positions[name]
+
+    def compute(self, landmarks):
+        """
+        Args:
+            landmarks (numpy.ndarray): Array of shape (..., 33, 4)
+
+        Returns:
+            numpy.ndarray: Angles in degrees of shape (..., 2 * len(joints))
+        """
+        landmarks = np.asarray(landmarks, dtype=np.float64)
+        middle = landmarks[..., self._middle, :3]
+        ba = landmarks[..., self._first, :3] - middle
+        bc = landmarks[..., self._last, :3] - middle
+
+        # 2D angle in the image plane, folded into [0, 180]
+        radians = (np.arctan2(bc[..., 1], bc[..., 0]) -
+                   np.arctan2(ba[..., 1], ba[..., 0]))
+        angles_2d = np.abs(np.degrees(radians))
+        angles_2d = np.where(angles_2d > 180.0, 360.0 - angles_2d, angles_2d)
+
+        # 3D angle from the normalized dot product
+        norms = np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)
+        cosines = np.einsum('...i,...i->...', ba, bc) / np.maximum(norms, 1e-9)
+        angles_3d = np.degrees(np.arccos(np.clip(cosines, -1.0, 1.0)))
+
+        return np.concatenate((angles_2d, angles_3d), axis=-1)
+
+    def visibility(self, landmarks):
+        """Lowest landmark visibility of each joint's triplet, shape (..., len(joints))"""
+        landmarks = np.asarray(landmarks, dtype=np.float64)
+        return np.minimum(np.minimum(landmarks[..., self._first, 3], landmarks[..., self._middle, 3]),
+                          landmarks[..., self._last, 3])
@@ -0,0 +1,354 @@
+import multiprocessing
+import struct
+import threading
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+from pose_angles import NUM_LANDMARKS, landmarks_to_array
+
+# Requests to a worker: op, lease, slot, height, width. Results back: slot, pose found, then the
+# landmarks as (33, 4) float32 x, y, z, visibility when one was found.
+REQUEST = struct.Struct('<BIHHH')
+RESULT = struct.Struct('<HB')
+OP_FRAME, OP_RESET, OP_CLOSE = 1, 2, 3
+
+
+class FrameRing:
+    """
+    Fixed-size frame slots in one shared memory block. The web process
+    writes a frame into a free slot and the worker reads it in place, so
+    frames cross the process boundary without being pickled.
+
+    Args:
+        slots (int): Frames that can be in flight at once
+        slot_bytes (int): Largest frame (height * width * 3) a slot holds
+        name (str): Attach to an existing ring instead of creating one
+    """
+
+    def __init__(self, slots, slot_bytes, name=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=slots * slot_bytes)
+        self.buffer = np.ndarray((slots, slot_bytes), dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def view(self, slot, height, width):
+        """The slot as a (height, width, 3) image"""
+        return self.buffer[slot, :height * width * 3].reshape(height, width, 3)
+
+    def close(self, unlink=False):
+        self.buffer = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _worker_main(conn, ring_name, slots, slot_bytes, pose_options):
+    """Worker process: one MediaPipe Pose per lease, fed frames from the shared ring"""
+    import mediapipe as mp
+
+    ring = FrameRing(slots, slot_bytes, name=ring_name)
+    poses = {}
+    landmarks = np.empty((NUM_LANDMARKS, 4), dtype=np.float32)
+    try:
+        while True:
+            try:
+                op, lease, slot, height, width = REQUEST.unpack(conn.recv_bytes())
+            except (EOFError, OSError):
+                break
+
+            if op == OP_FRAME:
+                pose = poses.get(lease)
+                if pose is None:
+                    pose = poses[lease] = mp.solutions.pose.Pose(**pose_options)
+                image = ring.view(slot, height, width)
+                image.flags.writeable = False
+                pose_landmarks = pose.process(image).pose_landmarks
+                if pose_landmarks:
+                    landmarks_to_array(pose_landmarks.landmark, landmarks)
+                    conn.send_bytes(RESULT.pack(slot, 1) + landmarks.tobytes())
+                else:
+                    conn.send_bytes(RESULT.pack(slot, 0))
+            elif op == OP_RESET and lease in poses:
+                poses[lease].reset()
+            elif op == OP_CLOSE and lease in poses:
+                poses.pop(lease).close()
+    finally:
+        for pose in poses.values():
+            pose.close()
+        ring.close()
+
+
+class _Worker:
+    """Web-process side of one worker process: its ring, request pipe and result reader"""
+
+    def __init__(self, context, slots, slot_bytes, pose_options):
+        self.ring = FrameRing(slots, slot_bytes)
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, daemon=True,
+                                       args=(child_conn, self.ring.name, slots, slot_bytes, pose_options))
+        self.process.start()
+        child_conn.close()
+
+        self.leases = 0
+        self.alive = True
+        self._send_lock = threading.Lock()
+        self._free = list(range(slots))
+        self._slot_lock = threading.Condition()
+        self._done = [threading.Event() for _ in range(slots)]
+        self._results = [None] * slots
+        # Slots whose frame timed out; they are reused only once the late result arrives
+        self._stale = set()
+        self._reader = threading.Thread(target=self._read_results, daemon=True)
+        self._reader.start()
+
+    def send(self, op, lease, slot=0, height=0, width=0):
+        if not self.alive:
+            return False
+        try:
+            with self._send_lock:
+                self.conn.send_bytes(REQUEST.pack(op, lease, slot, height, width))
+            return True
+        except (BrokenPipeError, OSError):
+            self._died()
+            return False
+
+    def acquire_slot(self, timeout):
+        """
+        Returns:
+            int: A free slot, or None if the worker died or none came free within `timeout` seconds
+        """
+        with self._slot_lock:
+            if not self._slot_lock.wait_for(lambda: self._free or not self.alive, timeout) or not self.alive:
+                return None
+            slot = self._free.pop()
+        self._done[slot].clear()
+        self._results[slot] = None
+        return slot
+
+    def release_slot(self, slot):
+        with self._slot_lock:
+            self._free.append(slot)
+            self._slot_lock.notify()
+
+    def wait(self, slot, timeout):
+        """
+        Wait for the frame in `slot` and free the slot
+
+        Returns:
+            bytes: The landmark record, or None if no pose was found, the worker is gone or it timed out
+        """
+        if self._done[slot].wait(timeout):
+            result = self._results[slot]
+            self.release_slot(slot)
+            return result
+
+        with self._slot_lock:
+            if not self._done[slot].is_set():
+                self._stale.add(slot)
+                print(f"Pose worker {self.process.pid} did not answer within {timeout}s")
+                return None
+        result = self._results[slot]
+        self.release_slot(slot)
+        return result
+
+    def _read_results(self):
+        while True:
+            try:
+                message = self.conn.recv_bytes()
+            except (EOFError, OSError):
+                break
+            slot, found = RESULT.unpack_from(message)
+            with self._slot_lock:
+                if slot in self._stale:
+                    self._stale.discard(slot)
+                    self._free.append(slot)
+                    self._slot_lock.notify()
+                    continue
+                self._results[slot] = message[RESULT.size:] if found else None
+                self._done[slot].set()
+        self._died()
+
+    def _died(self):
+        with self._slot_lock:
+            if self.alive:
+                self.alive = False
+                print(f"Pose worker {self.process.pid} exited; its sessions move to another worker")
+            # Late results will never arrive, so timed-out slots come back now
+            self._free.extend(self._stale)
+            self._stale.clear()
+            self._slot_lock.notify_all()
+        # Wake anyone waiting on a frame that will never be answered
+        for done in self._done:
+            done.set()
+
+    def close(self):
+        self.alive = False
+        self.conn.close()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.close(unlink=True)
+
+
+class PoseWorkerPool:
+    """
+    Pose inference in separate processes, so live sessions spread over CPU
+    cores instead of sharing the web process's interpreter.
+
+    Each session's detector gets a RemotePose lease pinned to the least
+    loaded worker, which keeps a MediaPipe Pose per lease so tracking state
+    is preserved between frames. Frames go through the worker's shared
+    memory ring; only the 531-byte landmark record comes back. Workers are
+    started on the first lease, so importing the app spawns nothing. A
+    worker that dies is replaced, and its sessions move to a live worker on
+    their next frame (losing only their tracking state).
+
+    Args:
+        workers (int): Worker processes
+        slots (int): Frames each worker can have in flight
+        max_frame_size (tuple): (width, height) of the largest frame a slot holds; larger frames are downscaled
+        pose_options (dict): Keyword arguments for mediapipe.solutions.pose.Pose
+        timeout (float): Seconds to wait for a frame's result before treating it as no pose
+    """
+
+    def __init__(self, workers, slots=4, max_frame_size=(960, 720), pose_options=None, timeout=5.0):
+        self.workers = workers
+        self.slots = slots
+        self.max_frame_size = max_frame_size
+        self.pose_options = pose_options or {}
+        self.timeout = timeout
+        self._workers = []
+        # Dead workers replaced while leases still point at them; their ring stays mapped until the last one moves
+        self._retired = []
+        self._next_lease = 0
+        self._lock = threading.Lock()
+        # Spawn rather than fork: the web process is multithreaded and already holds MediaPipe state
+        self._context = multiprocessing.get_context('spawn')
+
+    def lease(self):
+        """A Pose-compatible handle on one of the workers"""
+        with self._lock:
+            self._next_lease += 1
+            return RemotePose(self, self._pick(), self._next_lease)
+
+    def _pick(self):
+        """The least loaded worker, after replacing any that died; call with the lock held"""
+        if not self._workers:
+            self._workers = [self._spawn() for _ in range(self.workers)]
+            print(f"Started {self.workers} pose worker processes")
+        for i, worker in enumerate(self._workers):
+            if not worker.alive:
+                self._workers[i] = self._spawn()
+                print(f"Replaced pose worker {worker.process.pid} with {self._workers[i].process.pid}")
+                self._retired.append(worker)
+                self._close_retired(worker)
+        worker = min(self._workers, key=lambda worker: worker.leases)
+        worker.leases += 1
+        return worker
+
+    def _spawn(self):
+        width, height = self.max_frame_size
+        return _Worker(self._context, self.slots, width * height * 3, self.pose_options)
+
+    def _move(self, worker):
+        """Move a lease off a dead worker onto a live one"""
+        with self._lock:
+            worker.leases -= 1
+            self._close_retired(worker)
+            return self._pick()
+
+    def _release(self, worker):
+        with self._lock:
+            worker.leases -= 1
+            self._close_retired(worker)
+
+    def _close_retired(self, worker):
+        """Unlink a replaced worker's ring once no lease can still be writing to it; call with the lock held"""
+        if worker.leases == 0 and worker in self._retired:
+            self._retired.remove(worker)
+            worker.close()
+
+    def close(self):
+        with self._lock:
+            workers, self._workers = self._workers + self._retired, []
+            self._retired = []
+        for worker in workers:
+            worker.close()
+
+
+class RemotePose:
+    """
+    Stands in for mediapipe.solutions.pose.Pose (process, reset, close) while
+    the inference runs in a PoseWorkerPool process. Calls are synchronous and
+    the caller serializes them, as with a local Pose.
+    """
+
+    class Results:
+        def __init__(self, pose_landmarks):
+            self.pose_landmarks = pose_landmarks
+
+    NO_POSE = Results(None)
+
+    def __init__(self, pool, worker, lease):
+        self.pool = pool
+        self.worker = worker
+        self.lease = lease
+        self._resized = None
+
+    def process(self, image):
+        """
+        Args:
+            image (numpy.ndarray): RGB frame
+
+        Returns:
+            Results: With `pose_landmarks` set as MediaPipe would, or None if no pose was found
+        """
+        worker = self.worker
+        if not worker.alive:
+            # The worker died; carry on with a fresh Pose on a live one
+            worker = self.worker = self.pool._move(worker)
+        height, width = image.shape[:2]
+        if height * width * 3 > worker.ring.slot_bytes:
+            # Landmarks are normalized, so a downscaled frame needs no rescaling afterwards
+            max_width, max_height = self.pool.max_frame_size
+            scale = min(max_width / width, max_height / height)
+            size = (int(width * scale), int(height * scale))
+            if self._resized is None or self._resized.shape[1::-1] != size:
+                self._resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            image = cv2.resize(image, size, dst=self._resized, interpolation=cv2.INTER_AREA)
+            height, width = size[1], size[0]
+
+        slot = worker.acquire_slot(self.pool.timeout)
+        if slot is None:
+            return self.NO_POSE
+        np.copyto(worker.ring.view(slot, height, width), image)
+        if not worker.send(OP_FRAME, self.lease, slot, height, width):
+            worker.release_slot(slot)
+            return self.NO_POSE
+        payload = worker.wait(slot, self.pool.timeout)
+        if payload is None:
+            return self.NO_POSE
+
+        landmarks = np.frombuffer(payload, dtype=np.float32, count=NUM_LANDMARKS * 4).reshape(NUM_LANDMARKS, 4)
+        return self.Results(landmark_pb2.NormalizedLandmarkList(landmark=[
+            landmark_pb2.NormalizedLandmark(x=x, y=y, z=z, visibility=visibility)
+            for x, y, z, visibility in landmarks.tolist()
+        ]))
+
+    def reset(self):
+        if self.worker is not None:
+            self.worker.send(OP_RESET, self.lease)
+
+    def close(self):
+        if self.worker is None:
+            return
+        self.worker.send(OP_CLOSE, self.lease)
+        self.pool._release(self.worker)
+        self.worker = None
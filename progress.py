@@ -0,0 +1,123 @@
+from datetime import timedelta
+
+from sqlalchemy import case, func, tuple_
+
+from models import db, DailySummary, DailyWorkout
+
+
+def _summary_query():
+    return db.session.query(
+        DailyWorkout.user_id,
+        DailyWorkout.date,
+        func.count(DailyWorkout.id),
+        func.sum(case((DailyWorkout.is_completed, 1), else_=0)),
+        func.sum(DailyWorkout.target_reps),
+        func.sum(func.coalesce(DailyWorkout.completed_reps, 0)),
+    )
+
+
+def refresh_daily_summaries(user_days):
+    """
+    Recompute the summaries of many (user_id, date) pairs from their
+    daily_tasks rows, with one DELETE and one aggregate INSERT ... SELECT.
+    Call it in the same transaction that changes the workouts; doesn't commit.
+    """
+    user_days = list(set(user_days))
+    if not user_days:
+        return
+    db.session.query(DailySummary).filter(
+        tuple_(DailySummary.user_id, DailySummary.date).in_(user_days)
+    ).delete(synchronize_session=False)
+    _insert_summaries(_summary_query().filter(tuple_(DailyWorkout.user_id, DailyWorkout.date).in_(user_days)))
+
+
+def refresh_summary_range(first_user, last_user, start, end):
+    """Recompute the summaries of a block of user ids over an inclusive date range. Doesn't commit."""
+    db.session.query(DailySummary).filter(
+        DailySummary.user_id.between(first_user, last_user), DailySummary.date.between(start, end)
+    ).delete(synchronize_session=False)
+    _insert_summaries(_summary_query().filter(
+        DailyWorkout.user_id.between(first_user, last_user), DailyWorkout.date.between(start, end)
+    ))
+
+
+def rebuild_daily_summaries(user_ids=None):
+    """Recompute summaries from scratch with one aggregate INSERT ... SELECT (all users if none given)"""
+    delete = db.session.query(DailySummary)
+    query = _summary_query()
+    if user_ids is not None:
+        delete = delete.filter(DailySummary.user_id.in_(user_ids))
+        query = query.filter(DailyWorkout.user_id.in_(user_ids))
+    delete.delete(synchronize_session=False)
+    _insert_summaries(query)
+    db.session.commit()
+
+
+def _insert_summaries(query):
+    query = query.add_columns(
+        func.count(DailyWorkout.id) == func.sum(case((DailyWorkout.is_completed, 1), else_=0))
+    ).group_by(DailyWorkout.user_id, DailyWorkout.date)
+
+    db.session.execute(DailySummary.__table__.insert().from_select(
+        ['user_id', 'date', 'exercise_count', 'completed_exercises', 'target_reps', 'completed_reps',
+         'is_completed'],
+        query.statement
+    ))
+
+
+def serialize_summary(summary):
+    return {
+        "exercise_count": summary.exercise_count,
+        "completed_exercises": summary.completed_exercises,
+        "target_reps": summary.target_reps,
+        "completed_reps": summary.completed_reps,
+        "is_completed": summary.is_completed
+    }
+
+
+def get_progress(user_id, start, end):
+    """Daily summaries for an inclusive date range, oldest first"""
+    return DailySummary.query.filter(
+        DailySummary.user_id == user_id,
+        DailySummary.date >= start,
+        DailySummary.date <= end
+    ).order_by(DailySummary.date).all()
+
+
+def total_progress(summaries):
+    totals = {
+        "days": 0,
+        "completed_days": 0,
+        "target_reps": 0,
+        "completed_reps": 0
+    }
+    for summary in summaries:
+        totals["days"] += 1
+        totals["completed_days"] += int(summary.is_completed)
+        totals["target_reps"] += summary.target_reps
+        totals["completed_reps"] += summary.completed_reps
+    return totals
+
+
+def current_streak(user_id, today, batch_size=64):
+    """
+    Number of consecutive completed days ending today, or yesterday if
+    today's workouts aren't finished yet. Reads only as many summaries as
+    the streak is long.
+    """
+    streak = 0
+    expected = today
+    query = DailySummary.query.filter(
+        DailySummary.user_id == user_id,
+        DailySummary.date <= today
+    ).order_by(DailySummary.date.desc())
+
+    for summary in query.yield_per(batch_size):
+        if summary.date == today and not summary.is_completed:
+            expected = today - timedelta(days=1)
+            continue
+        if summary.date != expected or not summary.is_completed:
+            break
+        streak += 1
+        expected -= timedelta(days=1)
+    return streak
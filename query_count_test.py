@@ -0,0 +1,75 @@
+"""
+Statement counts of the dashboard and calendar endpoints, which must stay
+fixed however long a user's workout history grows. Run with pytest;
+conftest.py points the app at a throwaway database.
+"""
+from datetime import date, timedelta
+
+import pytest
+
+import app as app_module
+from models import db, count_queries, DailyWorkout, Exercise, User
+from progress import rebuild_daily_summaries
+
+
+def seed(history_days):
+    db.drop_all()
+    db.create_all()
+    user = User(name='Test User', email='test@example.com', password_hash='unused')
+    db.session.add(user)
+    exercises = [Exercise(name=name) for name in ('squats', 'bicep_curls', 'push_ups')]
+    db.session.add_all(exercises)
+    db.session.flush()
+
+    today = date.today()
+    for offset in range(-history_days, 7):
+        for exercise in exercises:
+            db.session.add(DailyWorkout(user_id=user.id, exercise_id=exercise.id,
+                                        date=today + timedelta(days=offset), target_reps=10))
+    db.session.commit()
+    rebuild_daily_summaries()
+    return user.id
+
+
+@pytest.fixture(params=[0, 90], ids=['new-user', 'long-history'])
+def client(request):
+    flask_app = app_module.app
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        user_id = seed(request.param)
+        app_module.identities._cache.clear()
+        app_module.response_cache.clear()
+
+        client = flask_app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        client.user_id = user_id
+        yield client
+
+
+def statements(client, path):
+    with count_queries() as queries:
+        response = client.get(path)
+    assert response.status_code == 200
+    return queries.count
+
+
+def test_dashboard_queries(client):
+    # Loading the user's identity, then today's workouts joined with their exercises
+    assert statements(client, '/') == 2
+    # Both are cached now
+    assert statements(client, '/') == 0
+
+
+def test_calendar_queries(client):
+    # Loading the user's identity, then the month's workouts joined with exercise names
+    assert statements(client, '/calendar') == 2
+    assert statements(client, '/calendar') == 0
+
+
+def test_saved_reps_invalidate_cached_dashboard(client):
+    statements(client, '/')
+    app_module.response_cache.invalidate_user(client.user_id)
+    # Only the dashboard data is reloaded; the identity is still cached
+    assert statements(client, '/') == 1
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import date, datetime
+
+from sqlalchemy import func
+
+from models import db, DailyWorkout, Exercise, ReminderDelivery
+from workout_plans import CONFLICT_SKIPPING_INSERTS
+
+Reminder = namedtuple('Reminder', ['exercise_name', 'remaining_reps'])
+
+
+class LogChannel:
+    """Delivers reminders by printing them, as the app always has"""
+
+    def deliver(self, user_id, reminders):
+        print(f"Reminder for user ID {user_id}: You have incomplete workouts for today:")
+        for exercise_name, remaining_reps in reminders:
+            print(f"{exercise_name}: {remaining_reps} reps remaining")
+
+
+class FileChannel:
+    """
+    Appends reminders as JSON lines to a local outbox file, for a mailer or
+    push sender running next to the app to pick up.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def deliver(self, user_id, reminders):
+        line = json.dumps({
+            'user_id': user_id,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'incomplete_workouts': [reminder._asdict() for reminder in reminders],
+        })
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+
+def make_channel(name, outbox=None):
+    """Build a reminder channel from its config name ('log', 'file' or None for no delivery)"""
+    if name is None:
+        return None
+    if name == 'log':
+        return LogChannel()
+    if name == 'file':
+        return FileChannel(outbox)
+    raise ValueError(f"Unknown reminder channel '{name}'")
+
+
+class ReminderBoard:
+    """
+    Today's incomplete workouts for every user, computed in the background
+    so the dashboard reads a user's reminders with one dict lookup.
+
+    refresh() rebuilds the board from a single query over today's
+    unfinished daily_tasks rows and delivers each user's reminder through
+    the channel once per day. refresh(user_ids) updates just those users,
+    e.g. after their reps were saved, without delivering anything.
+
+    Deliveries are recorded in reminder_deliveries before they are sent,
+    so restarts and other app processes never send a user's reminder
+    twice in one day.
+
+    Args:
+        channel: Object with deliver(user_id, reminders), see make_channel; None only fills the board
+        claim_batch_size (int): Delivery rows written per statement
+    """
+
+    def __init__(self, channel=None, claim_batch_size=1000):
+        self.channel = channel
+        self.claim_batch_size = claim_batch_size
+        self.day = None
+        self.users = 0
+        self.refreshed_at = None
+        # user id -> tuple of Reminder; users with nothing left are absent
+        self._reminders = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """
+        Returns:
+            tuple: Reminder for each unfinished exercise, empty if the user has nothing left today
+        """
+        if self.day != date.today():
+            return ()
+        return self._reminders.get(user_id, ())
+
+    def refresh(self, user_ids=None):
+        """Recompute reminders for everyone, or only for `user_ids`. Needs an app context; commits."""
+        day = date.today()
+        # Only the scheduled full refresh delivers, never a save that happens to land first on a new day
+        deliver = user_ids is None
+        if self.day != day:
+            # Nothing current to patch; rebuild the whole board instead
+            user_ids = None
+        query = db.session.query(
+            DailyWorkout.user_id, Exercise.name,
+            DailyWorkout.target_reps - func.coalesce(DailyWorkout.completed_reps, 0)
+        ).join(Exercise, Exercise.id == DailyWorkout.exercise_id).filter(
+            DailyWorkout.date == day, DailyWorkout.is_completed.isnot(True)
+        ).order_by(DailyWorkout.user_id, DailyWorkout.exercise_id)
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            query = query.filter(DailyWorkout.user_id.in_(user_ids))
+
+        # One pass over the rows, sharing one string per exercise name across all users
+        reminders = {}
+        names = {}
+        for user_id, name, remaining_reps in query:
+            reminders.setdefault(user_id, []).append(Reminder(names.setdefault(name, name), remaining_reps))
+        reminders = {user_id: tuple(items) for user_id, items in reminders.items()}
+
+        with self._lock:
+            if user_ids is not None:
+                for user_id in user_ids:
+                    if user_id in reminders:
+                        self._reminders[user_id] = reminders[user_id]
+                    else:
+                        self._reminders.pop(user_id, None)
+                return
+
+            self._reminders = reminders
+            self.day = day
+            self.users = len(reminders)
+            self.refreshed_at = datetime.now()
+
+        if self.channel is not None and deliver:
+            for user_id in self._claim(day, reminders):
+                self.channel.deliver(user_id, reminders[user_id])
+
+    def _claim(self, day, reminders):
+        """
+        Record today's delivery for every user with reminders who hasn't had one yet
+
+        Returns:
+            list: The users this call claimed, whose reminders should be sent now
+        """
+        deliveries = ReminderDelivery.__table__
+        # Yesterday's rows are no longer needed
+        db.session.execute(deliveries.delete().where(deliveries.c.date < day))
+        delivered = set(db.session.execute(
+            db.select(deliveries.c.user_id).where(deliveries.c.date == day)).scalars())
+        pending = [user_id for user_id in reminders if user_id not in delivered]
+
+        # Rows another process inserted meanwhile are skipped, so only the users claimed here are returned
+        insert = CONFLICT_SKIPPING_INSERTS.get(db.engine.dialect.name)
+        now = datetime.utcnow()
+        claimed = []
+        for start in range(0, len(pending), self.claim_batch_size):
+            rows = [{'date': day, 'user_id': user_id, 'delivered_at': now}
+                    for user_id in pending[start:start + self.claim_batch_size]]
+            if insert is None:
+                db.session.execute(deliveries.insert(), rows)
+                claimed += [row['user_id'] for row in rows]
+            else:
+                claimed += db.session.execute(insert(deliveries).on_conflict_do_nothing(
+                    index_elements=['date', 'user_id']).returning(deliveries.c.user_id), rows).scalars().all()
+        db.session.commit()
+        return claimed
@@ -0,0 +1,220 @@
+import threading
+import time
+from datetime import date, datetime
+
+from sqlalchemy import bindparam
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, DailyWorkout, WorkoutCheckpoint
+from progress import refresh_daily_summaries
+
+
+class RepCheckpointer:
+    """
+    Write-behind persistence of live rep counts.
+
+    Every `interval` seconds a background thread writes the reps of every
+    session that changed since the last flush, for all sessions in one
+    transaction, so the database sees one write per interval however many
+    users are mid-workout. Ending or evicting a session flushes it at once;
+    if that final flush fails, the session is kept and retried by every
+    background flush until its reps are written.
+
+    Each session's absolute count is kept in a WorkoutCheckpoint row and
+    only the difference is added to daily_tasks, so a flush can be retried
+    or repeated without counting any rep twice. If the process dies, every
+    rep up to the last flush is already in daily_tasks, and the user's next
+    start of the same exercise that day resumes from the checkpoint.
+
+    Args:
+        app (Flask): Application whose database is written
+        sessions (SessionRegistry): Live workouts
+        interval (float): Seconds between background flushes
+        on_flush (callable): Called with the set of user ids whose reps were written
+    """
+
+    def __init__(self, app, sessions, interval=5.0, on_flush=None):
+        self.app = app
+        self.sessions = sessions
+        self.interval = interval
+        self.on_flush = on_flush
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        # Flushes are serialized so a session's final write always lands last; also guards _unfinished
+        self._lock = threading.RLock()
+        # Ended sessions whose final flush failed, retried until it succeeds
+        self._unfinished = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread after one last flush of every active session"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        with self.app.app_context():
+            self._recover()
+        while not self._stop.wait(self.interval):
+            self._flush_all()
+        self._flush_all()
+
+    def _flush_all(self):
+        with self._lock:
+            unfinished, self._unfinished = self._unfinished, []
+            self._flush_safely(self.sessions.all() + unfinished)
+            self._retry_unsaved(unfinished)
+
+    def _flush_safely(self, sessions):
+        """
+        Returns:
+            bool: False if the flush failed and was rolled back
+        """
+        with self.app.app_context():
+            try:
+                self.flush(sessions)
+                return True
+            except SQLAlchemyError as e:
+                # The counts are still in memory; the next flush retries them
+                db.session.rollback()
+                print(f"Rep checkpoint failed: {e}")
+                return False
+
+    def finish(self, session):
+        """
+        Write a session's final reps; called when it ends or is evicted. If the
+        write fails, the session is retried by the background flushes.
+        """
+        with self._lock:
+            if not self._flush_safely([session]):
+                self._retry_unsaved([session])
+
+    def _retry_unsaved(self, sessions):
+        # Only sessions whose latest count reached the database (and was marked ended) are let go
+        unsaved = [session for session in sessions if not session.final_flushed]
+        if unsaved:
+            print(f"Will retry saving the final reps of {len(unsaved)} ended workouts")
+            self._unfinished.extend(unsaved)
+
+    def resume(self, session):
+        """
+        Continue from an unfinished checkpoint of the same user, exercise and day,
+        e.g. after a restart. Call before the session starts counting.
+        """
+        with self._lock:
+            # An ended session still waiting to be saved hands its checkpoint and unsaved reps over
+            for previous in self._unfinished:
+                if (previous.user_id, previous.exercise_id, previous.workout_date) == \
+                        (session.user_id, session.exercise_id, session.workout_date):
+                    self._unfinished.remove(previous)
+                    session.checkpoint_id = previous.checkpoint_id
+                    session.flushed_reps = previous.flushed_reps
+                    session.current_reps = previous.snapshot()[0]
+                    print(f"Resuming workout for user ID {session.user_id} at {session.current_reps} reps")
+                    return True
+            return self._resume_from_database(session)
+
+    def _resume_from_database(self, session):
+        checkpoint = WorkoutCheckpoint.query.filter_by(
+            user_id=session.user_id, exercise_id=session.exercise_id,
+            date=session.workout_date, is_active=True
+        ).order_by(WorkoutCheckpoint.updated_at.desc()).first()
+        if checkpoint is None:
+            return False
+        session.checkpoint_id = checkpoint.id
+        session.current_reps = session.flushed_reps = checkpoint.reps
+        print(f"Resuming workout for user ID {session.user_id} at {checkpoint.reps} reps")
+        return True
+
+    def flush(self, sessions):
+        """
+        Write the reps of every given session that changed, in one transaction
+
+        Returns:
+            int: Number of sessions written
+        """
+        with self._lock:
+            started = time.perf_counter()
+            entries = []
+            for session in sessions:
+                reps = session.snapshot()[0]
+                active = session.active
+                if reps != session.flushed_reps or (not active and session.flushed_reps):
+                    entries.append((session, reps, active))
+                elif not active:
+                    # Ended without a rep to write
+                    session.final_flushed = True
+            if not entries:
+                return 0
+
+            ids = [session.checkpoint_id for session, _, _ in entries]
+            stored = dict(db.session.query(WorkoutCheckpoint.id, WorkoutCheckpoint.reps).filter(
+                WorkoutCheckpoint.id.in_(ids)))
+
+            now = datetime.utcnow()
+            deltas, updates, inserts = [], [], []
+            for session, reps, active in entries:
+                if session.checkpoint_id in stored:
+                    updates.append({'b_id': session.checkpoint_id, 'b_reps': reps, 'b_active': active,
+                                    'b_now': now})
+                else:
+                    inserts.append({'id': session.checkpoint_id, 'user_id': session.user_id,
+                                    'exercise_id': session.exercise_id, 'date': session.workout_date,
+                                    'reps': reps, 'is_active': active, 'updated_at': now})
+                delta = reps - stored.get(session.checkpoint_id, 0)
+                if delta:
+                    deltas.append({'b_user': session.user_id, 'b_exercise': session.exercise_id,
+                                   'b_date': session.workout_date, 'b_delta': delta})
+
+            tasks = DailyWorkout.__table__
+            if deltas:
+                completed = tasks.c.completed_reps + bindparam('b_delta')
+                db.session.execute(tasks.update().where(
+                    tasks.c.user_id == bindparam('b_user'),
+                    tasks.c.exercise_id == bindparam('b_exercise'),
+                    tasks.c.date == bindparam('b_date'),
+                ).values(completed_reps=completed, is_completed=completed >= tasks.c.target_reps), deltas)
+
+            checkpoints = WorkoutCheckpoint.__table__
+            if updates:
+                db.session.execute(checkpoints.update().where(checkpoints.c.id == bindparam('b_id')).values(
+                    reps=bindparam('b_reps'), is_active=bindparam('b_active'), updated_at=bindparam('b_now')
+                ), updates)
+            if inserts:
+                db.session.execute(checkpoints.insert(), inserts)
+
+            refresh_daily_summaries((row['b_user'], row['b_date']) for row in deltas)
+            db.session.commit()
+
+            for session, reps, active in entries:
+                session.flushed_reps = reps
+                session.final_flushed = not active
+            self.flushes += 1
+            self.last_flush_seconds = time.perf_counter() - started
+
+        if self.on_flush and deltas:
+            try:
+                self.on_flush({row['b_user'] for row in deltas})
+            except Exception as e:
+                # The reps are saved; a failing listener mustn't stop the background flushes
+                print(f"Rep checkpoint listener failed: {e}")
+        return len(entries)
+
+    def _recover(self):
+        """Close checkpoints left open by a previous process on an earlier day"""
+        try:
+            stale = WorkoutCheckpoint.query.filter(
+                WorkoutCheckpoint.is_active.is_(True), WorkoutCheckpoint.date < date.today()
+            ).update({'is_active': False}, synchronize_session=False)
+            db.session.commit()
+        except SQLAlchemyError:
+            # Tables not created yet, e.g. on first run
+            db.session.rollback()
+            return
+        if stale:
+            print(f"Closed {stale} workout checkpoints left open by a previous run")
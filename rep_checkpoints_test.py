@@ -0,0 +1,169 @@
+"""
+Rep checkpoint replay: failed writes are retried without losing or
+double-counting reps. Run with pytest; conftest.py points the app at a
+throwaway database.
+"""
+from datetime import date
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import app as app_module
+from models import db, DailyWorkout, Exercise, User, WorkoutCheckpoint
+from rep_checkpoints import RepCheckpointer
+from workout_sessions import SessionRegistry
+
+
+class FakeDetector:
+    def configure(self, budget):
+        pass
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeDetectorPool:
+    def acquire(self):
+        return FakeDetector()
+
+    def release(self, detector):
+        pass
+
+
+@pytest.fixture
+def checkpointer():
+    flask_app = app_module.app
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(User(id=1, name='Test User', email='test@example.com', password_hash='unused'))
+        db.session.add(Exercise(id=1, name='squats'))
+        db.session.add(DailyWorkout(user_id=1, exercise_id=1, date=date.today(), target_reps=10))
+        db.session.commit()
+
+    sessions = SessionRegistry(FakeDetectorPool())
+    checkpointer = RepCheckpointer(flask_app, sessions)
+    sessions.on_close = checkpointer.finish
+    yield checkpointer
+
+
+@pytest.fixture
+def failing_commits(monkeypatch):
+    """Makes the next `count` commits fail after their statements ran"""
+    class FailingCommits:
+        count = 0
+
+    commit = db.session.commit
+
+    def flaky_commit():
+        if FailingCommits.count:
+            FailingCommits.count -= 1
+            raise OperationalError('COMMIT', {}, Exception('database is locked'))
+        commit()
+
+    monkeypatch.setattr(db.session, 'commit', flaky_commit)
+    return FailingCommits
+
+
+def completed_reps():
+    with app_module.app.app_context():
+        return db.session.query(DailyWorkout.completed_reps).scalar()
+
+
+def start(checkpointer):
+    session = checkpointer.sessions.start(1, 1, 'squats', 10)
+    with app_module.app.app_context():
+        checkpointer.resume(session)
+    return session
+
+
+def test_failed_flush_is_replayed(checkpointer, failing_commits):
+    session = start(checkpointer)
+    session.update(0, 'up', 4)
+
+    failing_commits.count = 1
+    checkpointer._flush_all()
+    assert completed_reps() == 0
+    assert session.flushed_reps == 0
+
+    checkpointer._flush_all()
+    assert completed_reps() == 4
+    # Nothing changed since, so repeating the flush adds nothing
+    checkpointer._flush_all()
+    assert completed_reps() == 4
+
+
+def test_failed_finish_is_replayed(checkpointer, failing_commits):
+    session = start(checkpointer)
+    session.update(0, 'up', 4)
+
+    failing_commits.count = 2
+    checkpointer.sessions.end(1)
+    assert completed_reps() == 0
+    assert not session.final_flushed
+    assert checkpointer._unfinished == [session]
+
+    # The first retry fails as well and keeps the session queued
+    checkpointer._flush_all()
+    assert checkpointer._unfinished == [session]
+
+    checkpointer._flush_all()
+    assert completed_reps() == 4
+    assert session.final_flushed
+    assert checkpointer._unfinished == []
+
+
+def test_resume_takes_over_unfinished_session(checkpointer, failing_commits):
+    first = start(checkpointer)
+    first.update(0, 'up', 4)
+    checkpointer._flush_all()
+    first.update(0, 'up', 6)
+
+    # The final write of the last two reps fails, then the user starts the same exercise again
+    failing_commits.count = 1
+    checkpointer.sessions.end(1)
+    second = start(checkpointer)
+    assert second.current_reps == 6
+    assert second.checkpoint_id == first.checkpoint_id
+    assert checkpointer._unfinished == []
+
+    second.update(0, 'up', second.current_reps + 3)
+    checkpointer.sessions.end(1)
+    assert completed_reps() == 9
+    with app_module.app.app_context():
+        assert [(checkpoint.reps, checkpoint.is_active) for checkpoint in WorkoutCheckpoint.query] == [(9, False)]
+
+
+def test_resume_from_database_after_restart(checkpointer):
+    session = start(checkpointer)
+    session.update(0, 'up', 5)
+    checkpointer._flush_all()
+
+    # A new process only has the open checkpoint to go on
+    restarted = RepCheckpointer(app_module.app, SessionRegistry(FakeDetectorPool()))
+    resumed = restarted.sessions.start(1, 1, 'squats', 10)
+    with app_module.app.app_context():
+        assert restarted.resume(resumed)
+    assert resumed.current_reps == resumed.flushed_reps == 5
+
+    resumed.update(0, 'up', 7)
+    restarted._flush_all()
+    assert completed_reps() == 7
+
+
+def test_failing_listener_does_not_stop_flushes(checkpointer):
+    def broken_listener(user_ids):
+        raise RuntimeError('listener failed')
+
+    checkpointer.on_flush = broken_listener
+    session = start(checkpointer)
+    session.update(0, 'up', 3)
+    assert checkpointer._flush_safely([session])
+    assert session.flushed_reps == 3
+
+    session.update(0, 'up', 5)
+    checkpointer._flush_all()
+    assert completed_reps() == 5
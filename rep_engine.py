@@ -0,0 +1,265 @@
+"""
+Rep counting over landmark or joint-angle sequences, independent of
+MediaPipe and OpenCV.
+
+The live detector feeds it one frame at a time; recorded landmark logs
+(see LandmarkRecorder) and offline video analysis feed it whole arrays,
+which replay far faster than real time because the angles of every frame
+are computed in one vectorized pass. Replay a log from the command line:
+
+    python rep_engine.py instance/landmark_logs/<log>.npy --exercise bicep_curls
+"""
+import argparse
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from config import Config
+from pose_angles import NUM_LANDMARKS, AngleEngine
+
+ANGLES = AngleEngine()
+
+RepEvent = namedtuple('RepEvent', ['rep_number', 'timestamp', 'angle'])
+
+# One landmark log record: capture time and the frame's landmarks (NaN when no pose was found)
+LOG_DTYPE = np.dtype([('timestamp', '<f8'), ('landmarks', '<f4', (NUM_LANDMARKS, 4))])
+
+
+class ExerciseRule:
+    """
+    An exercise definition compiled for the per-frame loop: the tracked
+    joint is resolved to its position in the angle vector and every
+    threshold is a plain attribute, so stepping a frame does no lookups.
+
+    A rep starts with the joint extended ('up'). Moving past `flexed` enters
+    'down' and moving back past `extended` returns to 'up'; `count_on`
+    says which of the two transitions completes a rep.
+
+    Args:
+        name (str): Exercise name as stored in the database
+        joint (str): AngleEngine joint the exercise is tracked by
+        extended (float): Angle above which the joint counts as extended
+        flexed (float): Angle below which the joint counts as flexed
+        count_on (str): 'flex' to count on entering 'down', 'extend' to count on returning to 'up'
+        progress_range (tuple): (min, max) angle mapped to 0-100% on the progress bar
+        title (str): Label shown on the video overlay
+    """
+
+    __slots__ = ('name', 'joint', 'index', 'extended', 'flexed', 'count_on', 'count_on_flex',
+                 'min_angle', 'max_angle', 'title')
+
+    def __init__(self, name, joint, extended, flexed, count_on, progress_range=(25, 178), title=None):
+        if count_on not in ('flex', 'extend'):
+            raise ValueError(f"{name}: count_on must be 'flex' or 'extend', not {count_on!r}")
+        if flexed >= extended:
+            raise ValueError(f"{name}: flexed threshold must be below the extended one")
+        self.name = name
+        self.joint = joint
+        self.index = ANGLES.index(joint)
+        self.extended = extended
+        self.flexed = flexed
+        self.count_on = count_on
+        self.count_on_flex = count_on == 'flex'
+        self.min_angle, self.max_angle = progress_range
+        self.title = title or name.replace('_', ' ').upper()
+
+    def with_thresholds(self, extended=None, flexed=None):
+        """Copy of the rule with some thresholds replaced, e.g. while tuning"""
+        return ExerciseRule(self.name, self.joint,
+                            self.extended if extended is None else extended,
+                            self.flexed if flexed is None else flexed,
+                            self.count_on, (self.min_angle, self.max_angle), self.title)
+
+    def step(self, angle, stage, counter):
+        """Advance the state machine by one frame's angle; returns (stage, counter)"""
+        if angle > self.extended:
+            if stage != "up":
+                if stage == "down" and not self.count_on_flex:
+                    counter += 1
+                stage = "up"
+        elif angle < self.flexed:
+            if stage == "up":
+                stage = "down"
+                if self.count_on_flex:
+                    counter += 1
+        return stage, counter
+
+    def progress(self, angle):
+        """Position of the angle within the exercise's range, in percent"""
+        return (angle - self.min_angle) / (self.max_angle - self.min_angle) * 100
+
+
+def compile_exercises(definitions):
+    """
+    Compile exercise definitions (see Config.EXERCISE_DEFINITIONS) into a lookup table
+
+    Returns:
+        dict: Lowercased name or alias -> ExerciseRule
+    """
+    rules = {}
+    for name, definition in definitions.items():
+        definition = dict(definition)
+        aliases = definition.pop('aliases', [])
+        rule = ExerciseRule(name, **definition)
+        for key in [name, *aliases]:
+            rules[key.lower()] = rule
+    return rules
+
+
+RULES = compile_exercises(Config.EXERCISE_DEFINITIONS)
+
+
+def lookup(exercise):
+    """Resolve an exercise name (or an already compiled rule) to its ExerciseRule, or None"""
+    if exercise is None or isinstance(exercise, ExerciseRule):
+        return exercise
+    return RULES.get(exercise.lower())
+
+
+def detect(exercise, angles, stage, counter):
+    """
+    Advance an exercise's rep state machine by one frame
+
+    Args:
+        exercise (ExerciseRule): Compiled rule; a name also works but costs a lookup per call
+        angles (numpy.ndarray): AngleEngine angle vector of the frame
+
+    Returns:
+        tuple: angle, stage, counter
+    """
+    rule = lookup(exercise)
+    if rule is None:
+        return 0, stage, counter
+    angle = float(angles[rule.index])
+    stage, counter = rule.step(angle, stage, counter)
+    return angle, stage, counter
+
+
+def count_reps(exercise, angles, timestamps, stage='init'):
+    """
+    Run an exercise's state machine over a whole angle sequence
+
+    Args:
+        exercise (ExerciseRule): Compiled rule or exercise name
+        angles (numpy.ndarray): (frames, joints) AngleEngine angles, NaN rows where no pose was found
+        timestamps (numpy.ndarray): Time of each frame in seconds
+
+    Returns:
+        list: RepEvent for every counted rep
+    """
+    rule = lookup(exercise)
+    if rule is None:
+        return []
+
+    # Only the tracked joint matters, so pull it out once as plain floats
+    column = np.asarray(angles)[:, rule.index]
+    found = np.flatnonzero(~np.isnan(column))
+    values = column[found].tolist()
+    times = np.asarray(timestamps)[found].tolist()
+
+    step = rule.step
+    counter = 0
+    reps = []
+    for angle, timestamp in zip(values, times):
+        stage, new_counter = step(angle, stage, counter)
+        if new_counter > counter:
+            reps.append(RepEvent(new_counter, timestamp, angle))
+        counter = new_counter
+    return reps
+
+
+def count_reps_in_log(log, exercise):
+    """
+    Count reps in a landmark log
+
+    Args:
+        log (numpy.ndarray): LOG_DTYPE records, e.g. from load_log
+
+    Returns:
+        list: RepEvent for every counted rep, timestamps relative to the first frame
+    """
+    if not len(log):
+        return []
+    angles = ANGLES.compute(log['landmarks'])
+    timestamps = log['timestamp'] - log['timestamp'][0]
+    return count_reps(exercise, angles, timestamps)
+
+
+class LandmarkRecorder:
+    """
+    Appends one fixed-size record per frame to a raw file while a session
+    runs, and turns it into a .npy log (memory-mappable with load_log) on
+    close. If the process dies first, the partial raw file still loads.
+
+    Args:
+        path (str): Destination .npy file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.partial_path = path + '.part'
+        self.frames = 0
+        self._record = np.zeros(1, dtype=LOG_DTYPE)
+        self._missing = np.full((NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(self.partial_path, 'wb')
+
+    def write(self, timestamp, landmarks):
+        """
+        Args:
+            timestamp (float): Capture time in seconds
+            landmarks (numpy.ndarray): (33, 4) landmarks, or None if no pose was found
+        """
+        if self._file is None:
+            return
+        self._record['timestamp'] = timestamp
+        self._record['landmarks'] = self._missing if landmarks is None else landmarks
+        self._file.write(self._record.tobytes())
+        self.frames += 1
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        records = np.fromfile(self.partial_path, dtype=LOG_DTYPE)
+        np.save(self.path, records)
+        os.remove(self.partial_path)
+
+
+def load_log(path):
+    """Memory-map a landmark log, or read a partial one left behind by a crash"""
+    if path.endswith('.part'):
+        return np.fromfile(path, dtype=LOG_DTYPE)
+    return np.load(path, mmap_mode='r')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded landmark log through the rep counter")
+    parser.add_argument('log', help="Landmark log (.npy, or .npy.part from an interrupted session)")
+    parser.add_argument('--exercise', required=True, choices=sorted(RULES))
+    parser.add_argument('--extended', type=float, help="Override the extended-angle threshold")
+    parser.add_argument('--flexed', type=float, help="Override the flexed-angle threshold")
+    parser.add_argument('--repeat', type=int, default=1, help="Replay this many times to measure speed")
+    args = parser.parse_args()
+
+    log = load_log(args.log)
+    rule = RULES[args.exercise].with_thresholds(args.extended, args.flexed)
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        reps = count_reps_in_log(log, rule)
+    elapsed = time.perf_counter() - started
+
+    for rep in reps:
+        print(f"rep {rep.rep_number:>3} at {rep.timestamp:8.2f}s  angle {rep.angle:6.1f}")
+    duration = float(log['timestamp'][-1] - log['timestamp'][0]) if len(log) > 1 else 0.0
+    print(f"{len(reps)} reps in {len(log)} frames ({duration:.1f}s recorded)")
+    if elapsed and duration:
+        print(f"replayed {args.repeat}x at {duration * args.repeat / elapsed:,.0f}x real time")
+
+
+if __name__ == '__main__':
+    main()
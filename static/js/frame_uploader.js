@@ -0,0 +1,78 @@
+// Browser-side capture for STREAM_MODE 'browser': grabs frames from a local
+// <video>, downscales them to JPEG and posts them to /ingest_frame one at a
+// time. Each response is a packed landmark frame (see landmark_codec.py).
+(function (global) {
+    class FrameUploader {
+        /**
+         * @param {HTMLVideoElement} video Playing camera stream
+         * @param {string} url Ingest endpoint
+         * @param {object} options width, quality, maxFps, onResult(ArrayBuffer)
+         */
+        constructor(video, url, options = {}) {
+            this.video = video;
+            this.url = url;
+            this.width = options.width || 480;
+            this.quality = options.quality || 0.7;
+            this.interval = 1000 / (options.maxFps || 15);
+            this.onResult = options.onResult || null;
+            this.canvas = document.createElement('canvas');
+            this.sequence = 0;
+            this.running = false;
+        }
+
+        start() {
+            this.running = true;
+            this.next();
+        }
+
+        stop() {
+            this.running = false;
+        }
+
+        next() {
+            if (!this.running) {
+                return;
+            }
+            const started = performance.now();
+            const schedule = (wait) => {
+                setTimeout(() => this.next(), Math.max(wait, this.interval - (performance.now() - started)));
+            };
+            if (this.video.readyState < 2) {
+                schedule(this.interval);
+                return;
+            }
+
+            // Downscale before encoding; landmarks are normalized so the server doesn't care about size
+            this.canvas.width = this.width;
+            this.canvas.height = Math.round(this.video.videoHeight * this.width / this.video.videoWidth);
+            this.canvas.getContext('2d').drawImage(this.video, 0, 0, this.canvas.width, this.canvas.height);
+            this.canvas.toBlob((blob) => {
+                const sequence = this.sequence++;
+                fetch(`${this.url}?seq=${sequence}`, {
+                    method: 'POST',
+                    body: blob,
+                    headers: { 'Content-Type': 'image/jpeg' }
+                })
+                .then(response => {
+                    if (response.status === 404) {
+                        // The workout has ended
+                        this.stop();
+                    }
+                    return response.ok ? response.arrayBuffer() : null;
+                })
+                .then(buffer => {
+                    if (buffer && this.onResult) {
+                        this.onResult(buffer);
+                    }
+                    schedule(0);
+                })
+                .catch(error => {
+                    console.error('Frame upload failed:', error);
+                    schedule(1000);
+                });
+            }, 'image/jpeg', this.quality);
+        }
+    }
+
+    global.FrameUploader = FrameUploader;
+})(window);
@@ -0,0 +1,200 @@
+// Client-side overlay for the landmark stream (/landmark_feed or /landmark_ws).
+// Decodes the packed frames produced by landmark_codec.py and draws the
+// skeleton and HUD that the server would otherwise render into the JPEG.
+(function (global) {
+    const HEADER_SIZE = 21;
+    const LANDMARK_SIZE = 5;
+    const NUM_LANDMARKS = 33;
+    const COORD_SCALE = 16384;
+    const FLAG_LANDMARKS = 1;
+    const STAGES = ['init', 'up', 'down'];
+
+    // mediapipe.solutions.pose.POSE_CONNECTIONS
+    const CONNECTIONS = [
+        [0, 1], [0, 4], [1, 2], [2, 3], [3, 7], [4, 5], [5, 6], [6, 8], [9, 10],
+        [11, 12], [11, 13], [11, 23], [12, 14], [12, 24], [13, 15], [14, 16],
+        [15, 17], [15, 19], [15, 21], [16, 18], [16, 20], [16, 22], [17, 19],
+        [18, 20], [23, 24], [23, 25], [24, 26], [25, 27], [26, 28], [27, 29],
+        [27, 31], [28, 30], [28, 32], [29, 31], [30, 32]
+    ];
+
+    // Same colors as ExerciseDetector (converted from BGR)
+    const BLUE = 'rgb(25, 117, 245)';
+    const GREEN = 'rgb(0, 200, 0)';
+    const LANDMARK_COLOR = 'rgb(66, 117, 245)';
+    const CONNECTION_COLOR = 'rgb(230, 66, 245)';
+    const MIN_VISIBILITY = 0.5;
+
+    function decodeFrame(buffer) {
+        const view = new DataView(buffer);
+        const frame = {
+            version: view.getUint8(0),
+            sequence: view.getUint32(2, true),
+            timestamp: view.getUint32(6, true),
+            reps: view.getUint16(10, true),
+            stage: STAGES[view.getUint8(12)] || 'init',
+            angle: view.getFloat32(13, true),
+            progress: view.getFloat32(17, true),
+            landmarks: null
+        };
+        if (view.getUint8(1) & FLAG_LANDMARKS) {
+            frame.landmarks = [];
+            for (let i = 0; i < NUM_LANDMARKS; i++) {
+                const offset = HEADER_SIZE + i * LANDMARK_SIZE;
+                frame.landmarks.push({
+                    x: view.getInt16(offset, true) / COORD_SCALE,
+                    y: view.getInt16(offset + 2, true) / COORD_SCALE,
+                    visibility: view.getUint8(offset + 4) / 255
+                });
+            }
+        }
+        return frame;
+    }
+
+    function base64ToBuffer(data) {
+        const binary = atob(data);
+        const bytes = new Uint8Array(binary.length);
+        for (let i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return bytes.buffer;
+    }
+
+    class LandmarkOverlay {
+        /**
+         * @param {HTMLCanvasElement} canvas Surface to draw on
+         * @param {string} url SSE endpoint, a ws:// / wss:// WebSocket endpoint, or null when
+         *                     frames are fed to receive() directly (see FrameUploader)
+         * @param {object} options exerciseName, video (optional element drawn underneath), onFrame callback
+         */
+        constructor(canvas, url, options = {}) {
+            this.canvas = canvas;
+            this.context = canvas.getContext('2d');
+            this.url = url;
+            this.exerciseName = options.exerciseName || '';
+            this.video = options.video || null;
+            this.onFrame = options.onFrame || null;
+            this.latest = null;
+            this.source = null;
+            this.animation = null;
+        }
+
+        start() {
+            if (!this.url) {
+                // Frames arrive through receive()
+            } else if (this.url.startsWith('ws')) {
+                const socket = new WebSocket(this.url);
+                socket.binaryType = 'arraybuffer';
+                socket.onmessage = (event) => this.receive(event.data);
+                this.source = socket;
+            } else {
+                const events = new EventSource(this.url);
+                events.onmessage = (event) => this.receive(base64ToBuffer(event.data));
+                this.source = events;
+            }
+            // Draw at display rate; frames arriving in between just replace `latest`
+            const loop = () => {
+                this.draw();
+                this.animation = requestAnimationFrame(loop);
+            };
+            this.animation = requestAnimationFrame(loop);
+        }
+
+        stop() {
+            if (this.source) {
+                this.source.close();
+                this.source = null;
+            }
+            if (this.animation) {
+                cancelAnimationFrame(this.animation);
+                this.animation = null;
+            }
+        }
+
+        receive(buffer) {
+            this.latest = decodeFrame(buffer);
+            if (this.onFrame) {
+                this.onFrame(this.latest);
+            }
+        }
+
+        draw() {
+            const ctx = this.context;
+            const width = this.canvas.width;
+            const height = this.canvas.height;
+
+            if (this.video && this.video.readyState >= 2) {
+                ctx.drawImage(this.video, 0, 0, width, height);
+            } else {
+                ctx.fillStyle = 'black';
+                ctx.fillRect(0, 0, width, height);
+            }
+
+            const frame = this.latest;
+            if (!frame) {
+                return;
+            }
+            if (frame.landmarks) {
+                this.drawSkeleton(frame.landmarks, width, height);
+            }
+            this.drawHud(frame, width);
+        }
+
+        drawSkeleton(landmarks, width, height) {
+            const ctx = this.context;
+            ctx.lineWidth = 2;
+            ctx.strokeStyle = CONNECTION_COLOR;
+            ctx.beginPath();
+            for (const [a, b] of CONNECTIONS) {
+                const start = landmarks[a];
+                const end = landmarks[b];
+                if (start.visibility < MIN_VISIBILITY || end.visibility < MIN_VISIBILITY) {
+                    continue;
+                }
+                ctx.moveTo(start.x * width, start.y * height);
+                ctx.lineTo(end.x * width, end.y * height);
+            }
+            ctx.stroke();
+
+            ctx.fillStyle = LANDMARK_COLOR;
+            for (const point of landmarks) {
+                if (point.visibility < MIN_VISIBILITY) {
+                    continue;
+                }
+                ctx.beginPath();
+                ctx.arc(point.x * width, point.y * height, 3, 0, 2 * Math.PI);
+                ctx.fill();
+            }
+        }
+
+        drawHud(frame, width) {
+            // Mirrors ExerciseDetector.render_ui
+            const ctx = this.context;
+            ctx.fillStyle = BLUE;
+            ctx.fillRect(width / 2 - 150, 0, 400, 73);
+            ctx.fillRect(0, 0, 255, 73);
+
+            ctx.fillStyle = 'white';
+            ctx.font = 'bold 28px sans-serif';
+            ctx.fillText(`${this.exerciseName.toUpperCase()} Tracker`, width / 2 - 100, 50);
+            ctx.fillText(String(frame.reps), 10, 60);
+            ctx.fillText(frame.stage, 95, 60);
+            ctx.font = '14px sans-serif';
+            ctx.fillText('REPS', 15, 25);
+            ctx.fillText('STAGE', 95, 25);
+
+            const progress = Math.max(0, Math.min(100, frame.progress));
+            ctx.fillStyle = GREEN;
+            ctx.fillRect(50, 350, progress * 2, 20);
+            ctx.strokeStyle = 'white';
+            ctx.lineWidth = 2;
+            ctx.strokeRect(50, 350, 200, 20);
+            ctx.fillStyle = 'white';
+            ctx.font = 'bold 28px sans-serif';
+            ctx.fillText(`${Math.round(progress)}%`, 50, 400);
+        }
+    }
+
+    LandmarkOverlay.decodeFrame = decodeFrame;
+    global.LandmarkOverlay = LandmarkOverlay;
+})(window);
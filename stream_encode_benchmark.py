@@ -0,0 +1,63 @@
+import argparse
+import json
+import time
+
+import cv2
+
+from config import Config
+from exercise_detection_benchmark import load_frames
+from frame_pipeline import FrameEncoder, StreamPreset
+
+
+def legacy_encode(frame):
+    """The per-frame encode as it was before presets, kept here as the baseline"""
+    ret, buffer = cv2.imencode('.jpg', frame)
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+
+
+def measure(encode, frames, fps):
+    encode(frames[0])
+    sizes = []
+    started = time.perf_counter()
+    for frame in frames:
+        sizes.append(len(encode(frame)))
+    elapsed = time.perf_counter() - started
+
+    bytes_per_frame = sum(sizes) / len(sizes)
+    return {
+        'ms_per_frame': 1000 * elapsed / len(frames),
+        'bytes_per_frame': bytes_per_frame,
+        # What one viewer receives at the capture rate, capped by the preset's frame rate
+        'bytes_per_second': bytes_per_frame * fps,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JPEG stream encoding cost per preset")
+    parser.add_argument('--video', help="Recorded clip to encode instead of synthetic frames")
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--width', type=int, default=960)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=float, default=30, help="Capture frame rate")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames, args.width, args.height)
+    results = {'legacy': measure(legacy_encode, frames, args.fps)}
+    for name, preset in Config.STREAM_PRESETS.items():
+        preset = StreamPreset(**preset) if preset else StreamPreset()
+        fps = min(args.fps, preset.max_fps) if preset.max_fps else args.fps
+        results[name] = measure(FrameEncoder(preset).encode, frames, fps)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, result in results.items():
+        print(f"{name:>8}: {result['ms_per_frame']:.2f} ms/frame, "
+              f"{result['bytes_per_frame'] / 1024:.1f} KiB/frame, "
+              f"{result['bytes_per_second'] / 1024:.0f} KiB/s")
+
+
+if __name__ == '__main__':
+    main()
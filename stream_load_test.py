@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from asgi_stream import StreamServer
+
+
+class SyntheticSource:
+    """
+    Stands in for a session's frame pipeline: a single thread publishes
+    pre-encoded JPEG chunks to every attached client at a fixed rate.
+    """
+
+    def __init__(self, fps=30, width=960, height=720, quality=80):
+        self.interval = 1.0 / fps
+        self.chunks = []
+        for i in range(30):
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+            cv2.circle(frame, (int(width * (i + 1) / 31), height // 2), 60, (0, 200, 0), -1)
+            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            self.chunks.append(b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+        self.clients = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._running = True
+        self._thread = threading.Thread(target=self._publish, daemon=True)
+        self._thread.start()
+
+    def attach(self, user_id, client):
+        with self._lock:
+            self.clients.append(client)
+
+        def detach():
+            with self._lock:
+                self.clients.remove(client)
+                self.dropped += client.dropped
+            client.close()
+        return detach
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+
+    def _publish(self):
+        index = 0
+        next_frame = time.perf_counter()
+        while self._running:
+            with self._lock:
+                clients = list(self.clients)
+            chunk = self.chunks[index % len(self.chunks)]
+            for client in clients:
+                client.put(chunk)
+            index += 1
+            next_frame += self.interval
+            time.sleep(max(0.0, next_frame - time.perf_counter()))
+
+
+async def in_process_client(app, seconds, delay):
+    """Drive the ASGI app directly with a simulated viewer that takes `delay` seconds per frame"""
+    received = 0
+    disconnected = asyncio.Event()
+
+    async def receive():
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal received
+        if message['type'] == 'http.response.body' and message.get('body'):
+            received += 1
+            if delay:
+                await asyncio.sleep(delay)
+
+    scope = {'type': 'http', 'path': '/video_feed', 'headers': []}
+    task = asyncio.ensure_future(app(scope, receive, send))
+    await asyncio.sleep(seconds)
+    disconnected.set()
+    await task
+    return received
+
+
+async def socket_client(port, seconds, delay):
+    """Real HTTP viewer reading the multipart stream from a running server"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /video_feed HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    await writer.drain()
+
+    received = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            data = await asyncio.wait_for(reader.read(65536), timeout=deadline - time.perf_counter())
+        except asyncio.TimeoutError:
+            break
+        if not data:
+            break
+        received += data.count(b'--frame')
+        if delay:
+            await asyncio.sleep(delay)
+    writer.close()
+    return received
+
+
+async def run_clients(client, args, target):
+    """
+    Returns:
+        tuple: (frames received per client, peak thread count while streaming)
+    """
+    slow_clients = int(args.clients * args.slow_fraction)
+    peak_threads = threading.active_count()
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while True:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.25)
+
+    sampler = asyncio.ensure_future(sample_threads())
+    received = await asyncio.gather(*[
+        client(target, args.seconds, args.slow_delay if i < slow_clients else 0)
+        for i in range(args.clients)
+    ])
+    sampler.cancel()
+    return received, peak_threads
+
+
+def start_server(app, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open many concurrent /video_feed streams against a synthetic source")
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--slow-fraction', type=float, default=0.1,
+                        help="Share of viewers that consume slower than the frame rate")
+    parser.add_argument('--slow-delay', type=float, default=0.2, help="Seconds a slow viewer spends per read")
+    parser.add_argument('--server', action='store_true', help="Serve over real sockets with uvicorn")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    source = SyntheticSource(fps=args.fps)
+    app = StreamServer(source.attach, lambda scope: 1)
+    started = time.perf_counter()
+    if args.server:
+        server, thread = start_server(app, args.port)
+        received, peak_threads = asyncio.run(run_clients(socket_client, args, args.port))
+        server.should_exit = True
+        thread.join()
+    else:
+        received, peak_threads = asyncio.run(run_clients(in_process_client, args, app))
+    elapsed = time.perf_counter() - started
+    source.stop()
+
+    per_client = [count / args.seconds for count in received]
+    results = {
+        'clients': args.clients,
+        'mode': 'server' if args.server else 'in_process',
+        'seconds': elapsed,
+        'frames_delivered': sum(received),
+        'mean_client_fps': sum(per_client) / len(per_client),
+        'min_client_fps': min(per_client),
+        'frames_dropped': source.dropped,
+        'peak_threads': peak_threads,
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, value in results.items():
+        print(f"{name:>18}: {value:.2f}" if isinstance(value, float) else f"{name:>18}: {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import multiprocessing
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import rep_engine
+from config import Config
+from exercise_detection import ExerciseDetector
+from models import db, Exercise, RepResult, User, VideoAnalysis
+
+# Detector owned by each pool worker process
+_worker_detector = None
+
+
+def _init_worker():
+    global _worker_detector
+    # The pool already runs one process per core
+    cv2.setNumThreads(1)
+    _worker_detector = ExerciseDetector()
+
+
+def probe_video(path):
+    """
+    Returns:
+        tuple: (frame count, fps); fps is 0 if the video can't be opened
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return 0, 0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    return frame_count, fps
+
+
+def plan_chunks(frame_count, fps, chunk_seconds):
+    """Split a video into (start, end) frame ranges of roughly `chunk_seconds` each"""
+    if frame_count <= 0:
+        # Unknown length: read the whole video in one chunk
+        return [(0, None)]
+    chunk_frames = max(1, int(chunk_seconds * fps))
+    return [(start, min(start + chunk_frames, frame_count))
+            for start in range(0, frame_count, chunk_frames)]
+
+
+def analyze_chunk(task):
+    """
+    Pool worker: estimate joint angles for one frame range of a video.
+
+    Pose tracking is reset at the start of each chunk and warmed up on the
+    frames just before it, so chunk boundaries see the same tracking state
+    a sequential pass would.
+
+    Returns:
+        tuple: (video index, start frame, angles of shape (frames, joints) with NaN rows where no pose was
+            found, or None if the chunk couldn't be analyzed)
+    """
+    video_index, path, start, end, warmup_frames = task
+    try:
+        return video_index, start, _estimate_chunk(path, start, end, warmup_frames)
+    except Exception as e:
+        # Reported per chunk so one bad video doesn't abort the rest of the pool run
+        print(f"Error analyzing {path} from frame {start}: {e}")
+        return video_index, start, None
+
+
+def _estimate_chunk(path, start, end, warmup_frames):
+    detector = _worker_detector
+    detector.reset()
+
+    first = max(0, start - warmup_frames)
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+
+    missing = np.full(len(detector.ANGLES.names), np.nan, dtype=np.float32)
+    rows = []
+    index = first
+    while end is None or index < end:
+        success, frame = cap.read()
+        if not success:
+            break
+        _, angles = detector.estimate_angles(frame)
+        if index >= start:
+            rows.append(missing if angles is None else angles.astype(np.float32))
+        index += 1
+    cap.release()
+
+    return np.array(rows, dtype=np.float32).reshape(len(rows), len(missing))
+
+
+def analyze_videos(videos, workers=None, chunk_seconds=Config.VIDEO_CHUNK_SECONDS,
+                   warmup_frames=Config.VIDEO_WARMUP_FRAMES):
+    """
+    Analyze recorded videos across a process pool
+
+    Args:
+        videos (list): (path, exercise type) pairs
+        workers (int): Pool size, defaults to the number of CPUs
+
+    Returns:
+        list: One dict per video with frame_count, duration and reps, or None if it couldn't be analyzed
+    """
+    tasks = []
+    probes = []
+    for video_index, (path, _) in enumerate(videos):
+        frame_count, fps = probe_video(path)
+        probes.append((frame_count, fps))
+        if not fps:
+            print(f"Error: Cannot open video {path}")
+            continue
+        for start, end in plan_chunks(frame_count, fps, chunk_seconds):
+            tasks.append((video_index, path, start, end, warmup_frames))
+
+    chunks = {video_index: [] for video_index in range(len(videos))}
+    if tasks:
+        # MediaPipe graphs don't survive fork, so each worker builds its own
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers, initializer=_init_worker) as pool:
+            for video_index, start, angles in pool.imap_unordered(analyze_chunk, tasks):
+                chunks[video_index].append((start, angles))
+
+    # Stitch chunks back in order and count reps sequentially in the parent
+    results = []
+    for video_index, (path, exercise_type) in enumerate(videos):
+        fps = probes[video_index][1]
+        ordered = [angles for _, angles in sorted(chunks[video_index], key=lambda chunk: chunk[0])]
+        if not fps or any(angles is None for angles in ordered):
+            results.append(None)
+            continue
+        angles = np.concatenate(ordered) if ordered else np.empty((0, len(rep_engine.ANGLES.names)))
+        try:
+            reps = rep_engine.count_reps(exercise_type, angles, np.arange(len(angles)) / fps)
+        except Exception as e:
+            print(f"Error counting reps in {path}: {e}")
+            results.append(None)
+            continue
+        results.append({
+            'frame_count': len(angles),
+            'duration': len(angles) / fps,
+            'reps': reps,
+        })
+    return results
+
+
+def process_analyses(analyses, workers=None):
+    """Analyze VideoAnalysis rows and store their per-rep results"""
+    if not analyses:
+        return
+    videos = [(analysis.video_path, analysis.exercise.name.lower()) for analysis in analyses]
+    results = analyze_videos(videos, workers)
+
+    for analysis, result in zip(analyses, results):
+        analysis.completed_at = datetime.utcnow()
+        if result is None:
+            analysis.status = 'failed'
+            continue
+        analysis.status = 'done'
+        analysis.frame_count = result['frame_count']
+        analysis.duration = result['duration']
+        analysis.total_reps = len(result['reps'])
+        db.session.add_all([
+            RepResult(analysis_id=analysis.id, rep_number=rep_number, timestamp=timestamp, angle=angle)
+            for rep_number, timestamp, angle in result['reps']
+        ])
+    db.session.commit()
+
+
+def process_pending(workers=None, batch_size=100):
+    """Work through every pending upload, `batch_size` videos per pool run"""
+    while True:
+        pending = VideoAnalysis.query.filter_by(status='pending').limit(batch_size).all()
+        if not pending:
+            return
+        print(f"Analyzing {len(pending)} pending videos")
+        process_analyses(pending, workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count reps in recorded workout videos")
+    parser.add_argument('videos', nargs='*', help="Video files to analyze")
+    parser.add_argument('--email', help="User the videos belong to")
+    parser.add_argument('--exercise', help="Exercise name, e.g. squats")
+    parser.add_argument('--pending', action='store_true', help="Process uploaded videos waiting in the queue")
+    parser.add_argument('--workers', type=int, default=Config.ANALYSIS_WORKERS)
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        db.create_all()
+        if args.pending:
+            process_pending(args.workers)
+            return
+
+        if not (args.videos and args.email and args.exercise):
+            parser.error("videos, --email and --exercise are required unless --pending is given")
+        user = User.query.filter_by(email=args.email).first()
+        exercise = Exercise.query.filter_by(name=args.exercise).first()
+        if not user or not exercise:
+            parser.error("Unknown user or exercise")
+
+        analyses = [VideoAnalysis(user_id=user.id, exercise_id=exercise.id, video_path=path)
+                    for path in args.videos]
+        db.session.add_all(analyses)
+        db.session.commit()
+        process_analyses(analyses, args.workers)
+
+        for analysis in analyses:
+            print(f"{analysis.video_path}: {analysis.status}, {analysis.total_reps} reps "
+                  f"in {analysis.duration:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
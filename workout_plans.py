@@ -0,0 +1,130 @@
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, and_, exists, false, func, literal, select, true, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, DailyWorkout, Exercise, User
+from progress import refresh_summary_range
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING; others fall back to a NOT EXISTS filter
+CONFLICT_SKIPPING_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+class PlanRoller:
+    """
+    Rolls every user's workout plan forward so each exercise has a
+    daily_tasks row for the next `days` days.
+
+    Users are processed in blocks of consecutive ids, each with one
+    set-based INSERT ... SELECT and its own transaction, so memory and lock
+    time stay bounded however many users there are. Days already planned
+    are skipped through the unique (user, date, exercise) index, which
+    makes runs idempotent: rerunning, or two processes running at once,
+    inserts nothing twice. A new day carries forward the target of the
+    user's latest planned day for that exercise.
+
+    Args:
+        days (int): Days ahead to plan, starting today
+        batch_size (int): Users per transaction
+        default_target_reps (int): Target for exercises a user has never been planned
+        on_batch (callable): Called with the user ids of each committed block, e.g. to invalidate caches
+    """
+
+    def __init__(self, days=7, batch_size=1000, default_target_reps=10, on_batch=None):
+        self.days = days
+        self.batch_size = batch_size
+        self.default_target_reps = default_target_reps
+        self.on_batch = on_batch
+        self.runs = 0
+        self.rows_inserted = 0
+        self.last_run = None
+
+    def run(self, start=None):
+        """
+        Plan `days` days from `start` (today by default). Needs an app context.
+
+        Returns:
+            dict: Timing and row counts of the run
+        """
+        started = time.perf_counter()
+        start = start or date.today()
+        plan_days = [start + timedelta(days=offset) for offset in range(self.days)]
+        inserted = batches = users = 0
+        slowest_batch = 0.0
+
+        last_user = 0
+        while True:
+            user_ids = db.session.execute(
+                select(User.id).where(User.id > last_user).order_by(User.id).limit(self.batch_size)
+            ).scalars().all()
+            if not user_ids:
+                break
+            batch_started = time.perf_counter()
+            first_user, last_user = user_ids[0], user_ids[-1]
+
+            rows = self._plan_block(first_user, last_user, plan_days)
+            if rows:
+                refresh_summary_range(first_user, last_user, plan_days[0], plan_days[-1])
+            db.session.commit()
+            if rows and self.on_batch:
+                self.on_batch(user_ids)
+
+            inserted += rows
+            users += len(user_ids)
+            batches += 1
+            slowest_batch = max(slowest_batch, time.perf_counter() - batch_started)
+
+        elapsed = time.perf_counter() - started
+        self.runs += 1
+        self.rows_inserted += inserted
+        self.last_run = {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'users': users,
+            'batches': batches,
+            'rows_inserted': inserted,
+            'seconds': elapsed,
+            'slowest_batch_seconds': slowest_batch,
+            'users_per_second': users / elapsed if elapsed else 0.0,
+        }
+        print(f"Planned {inserted} workouts for {users} users in {batches} batches ({elapsed:.2f}s)")
+        return self.last_run
+
+    def _plan_block(self, first_user, last_user, plan_days):
+        """Insert the missing rows of one block of user ids; returns the number inserted"""
+        tasks = DailyWorkout.__table__
+        users = User.__table__
+        exercises = Exercise.__table__
+        days = union_all(*[select(literal(day, Date).label('day')) for day in plan_days]).subquery('plan_days')
+
+        # Each user's most recently planned day per exercise, and that day's target
+        latest = select(
+            tasks.c.user_id, tasks.c.exercise_id, func.max(tasks.c.date).label('date')
+        ).where(tasks.c.user_id.between(first_user, last_user)).group_by(
+            tasks.c.user_id, tasks.c.exercise_id
+        ).subquery('latest')
+        previous = tasks.alias('previous')
+
+        query = select(
+            users.c.id, exercises.c.id, days.c.day,
+            func.coalesce(previous.c.target_reps, self.default_target_reps),
+            literal(0), false(), literal(datetime.utcnow()),
+        ).select_from(
+            users.join(exercises, true()).join(days, true())
+            .outerjoin(latest, and_(latest.c.user_id == users.c.id, latest.c.exercise_id == exercises.c.id))
+            .outerjoin(previous, and_(previous.c.user_id == latest.c.user_id,
+                                      previous.c.exercise_id == latest.c.exercise_id,
+                                      previous.c.date == latest.c.date))
+        ).where(users.c.id.between(first_user, last_user))
+
+        columns = ['user_id', 'exercise_id', 'date', 'target_reps', 'completed_reps', 'is_completed',
+                   'created_at']
+        insert = CONFLICT_SKIPPING_INSERTS.get(db.engine.dialect.name)
+        if insert is not None:
+            statement = insert(tasks).from_select(columns, query).on_conflict_do_nothing(
+                index_elements=['user_id', 'date', 'exercise_id'])
+        else:
+            statement = tasks.insert().from_select(columns, query.where(~exists().where(
+                tasks.c.user_id == users.c.id, tasks.c.exercise_id == exercises.c.id,
+                tasks.c.date == days.c.day)))
+        return db.session.execute(statement).rowcount
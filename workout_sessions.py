@@ -0,0 +1,190 @@
+import threading
+import time
+import uuid
+from datetime import date
+
+import rep_engine
+
+
+class WorkoutSession:
+    def __init__(self, user_id, exercise_id, exercise_name, target_reps, detector, stream_preset=None,
+                 recorder=None):
+        self.user_id = user_id
+        self.exercise_id = exercise_id
+        self.exercise_name = exercise_name
+        # Compiled rep rule, resolved once so the frame loop never matches names
+        self.exercise_rule = rep_engine.lookup(exercise_name)
+        self.target_reps = target_reps
+        self.current_reps = 0
+        self.stage = 'init'
+        # Day the reps count towards, and what RepCheckpointer has already written for them
+        self.workout_date = date.today()
+        self.checkpoint_id = uuid.uuid4().hex
+        self.flushed_reps = 0
+        self.final_flushed = False  # Set once the reps at the session's end are in the database
+        self.angle = 0
+
+        # Each session owns its own detector (and MediaPipe graph) while active
+        self.detector = detector
+        self.active = True
+        self.last_active = time.monotonic()
+
+        # Frame pipeline shared by every viewer of this session, started on demand
+        self.pipeline = None
+        self.stream_preset = stream_preset
+        # Optional LandmarkRecorder logging every inferred frame for later replay
+        self.recorder = recorder
+
+        # `lock` guards the rep state, `detector_lock` serializes use of the detector
+        self.lock = threading.Lock()
+        self.detector_lock = threading.Lock()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def update(self, angle, stage, counter):
+        with self.lock:
+            self.angle = angle
+            self.stage = stage
+            self.current_reps = counter
+        self.touch()
+
+    def subscribe(self, pipeline_factory, client=None, kind='video'):
+        """
+        Attach a viewer to the session's frame pipeline, starting it if needed
+
+        Args:
+            kind (str): 'video' or 'landmarks', see FramePipeline.subscribe
+
+        Returns:
+            tuple: (pipeline, client queue)
+        """
+        with self.lock:
+            if self.pipeline is None or not self.pipeline.running:
+                self.pipeline = pipeline_factory(self)
+                self.pipeline.start()
+            return self.pipeline, self.pipeline.subscribe(client, kind)
+
+    def snapshot(self):
+        """Return a consistent (reps, stage, angle) tuple"""
+        with self.lock:
+            return self.current_reps, self.stage, self.angle
+
+
+class DetectorPool:
+    """
+    Pool of ExerciseDetector instances so sessions don't pay the cost of
+    building a new MediaPipe graph every time a workout starts.
+
+    Args:
+        factory (callable): Creates a new detector
+        max_idle (int): Maximum number of idle detectors kept for reuse
+    """
+
+    def __init__(self, factory, max_idle=4):
+        self.factory = factory
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self.factory()
+
+    def release(self, detector):
+        # Drop any tracking state left over from the previous user
+        detector.reset()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(detector)
+                return
+        detector.close()
+
+
+class SessionRegistry:
+    """
+    Active workout sessions keyed by user id.
+
+    Args:
+        detector_pool (DetectorPool): Source of per-session detectors
+        idle_timeout (float): Seconds without activity before a session is evicted
+        on_close (callable): Called with each session once it has ended or been evicted
+    """
+
+    def __init__(self, detector_pool, idle_timeout=300, on_close=None):
+        self.detector_pool = detector_pool
+        self.idle_timeout = idle_timeout
+        self.on_close = on_close
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def start(self, user_id, exercise_id, exercise_name, target_reps, budget=None, stream_preset=None,
+              recorder=None):
+        self.evict_idle()
+
+        detector = self.detector_pool.acquire()
+        detector.configure(budget)
+        session = WorkoutSession(user_id, exercise_id, exercise_name, target_reps, detector, stream_preset,
+                                 recorder)
+
+        # Starting a new workout replaces any session the user already had. The swap happens under one
+        # lock, so of two concurrent starts the one replaced second is still closed.
+        with self._lock:
+            previous = self._sessions.get(user_id)
+            self._sessions[user_id] = session
+        if previous:
+            print(f"Replacing active workout for user ID {user_id}: {previous.exercise_name}")
+            self._close(previous)
+        return session
+
+    def get(self, user_id):
+        with self._lock:
+            session = self._sessions.get(user_id)
+        if session:
+            session.touch()
+        return session
+
+    def end(self, user_id):
+        """Remove the user's session and return its detector to the pool"""
+        with self._lock:
+            session = self._sessions.pop(user_id, None)
+        if session:
+            self._close(session)
+        return session
+
+    def evict_idle(self):
+        """End every session idle for longer than idle_timeout; meant to be run periodically"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [user_id for user_id, session in self._sessions.items()
+                       if now - session.last_active > self.idle_timeout]
+            evicted = [self._sessions.pop(user_id) for user_id in expired]
+
+        for session in evicted:
+            print(f"Evicting idle workout for user ID {session.user_id}")
+            self._close(session)
+        return evicted
+
+    def all(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def active_count(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def _close(self, session):
+        session.active = False
+        if session.pipeline is not None:
+            session.pipeline.stop()
+        # Wait for any in-flight frame to finish before handing the detector back
+        with session.detector_lock:
+            detector, session.detector = session.detector, None
+        if detector is not None:
+            self.detector_pool.release(detector)
+        if session.recorder is not None:
+            session.recorder.close()
+        if self.on_close is not None:
+            self.on_close(session)